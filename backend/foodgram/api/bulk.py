@@ -0,0 +1,270 @@
+import json
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from dish_recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                 RecipeTag, Tag)
+from dish_recipes.utils import BATCH_SIZE, bulk_create_with_pk, chunked
+
+from .caching import bump_version
+from .search import build_document
+from .serializers import RecipeRecordSerializer
+from .shopping_cart import deferred_cart_totals, recipe_ingredients_changed
+
+User = get_user_model()
+
+CONTENT_TYPE = 'application/x-ndjson'
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 200
+MAX_REPORTED_ERRORS = 100
+
+
+def export_recipes(queryset=None, chunk_size=None):
+    """
+    Рецепты строками NDJSON в порядке id. Рецепты читаются курсором
+    (.iterator), а теги и ингредиенты догружаются двумя запросами на
+    пачку из chunk_size рецептов, поэтому память не зависит от размера
+    выгрузки.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    recipes = queryset.select_related('author').only(
+        'id', 'name', 'text', 'image', 'cooking_time', 'pub_date',
+        'author__username',
+    ).order_by('pk').iterator(chunk_size=chunk_size)
+    for chunk in chunked(recipes, chunk_size):
+        ids = [recipe.pk for recipe in chunk]
+        tags = defaultdict(list)
+        for recipe_id, slug in RecipeTag.objects.filter(
+                recipe_id__in=ids).values_list(
+                'recipe_id', 'tag__slug').order_by('pk'):
+            tags[recipe_id].append(slug)
+        ingredients = defaultdict(list)
+        for recipe_id, name, unit, amount in RecipeIngredient.objects.filter(
+                recipe_id__in=ids).values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount').order_by('pk'):
+            ingredients[recipe_id].append(
+                {'name': name, 'measurement_unit': unit, 'amount': amount})
+        for recipe in chunk:
+            yield json.dumps({
+                'author': recipe.author.username,
+                'name': recipe.name,
+                'text': recipe.text,
+                'image': recipe.image.name,
+                'cooking_time': recipe.cooking_time,
+                'pub_date': recipe.pub_date.isoformat(),
+                'tags': tags[recipe.pk],
+                'ingredients': ingredients[recipe.pk],
+            }, ensure_ascii=False) + '\n'
+
+
+def parse_lines(lines):
+    """
+    Непустые строки NDJSON в виде (номер строки, запись, ошибки):
+    запись - проверенные данные, если строка корректна. Один экземпляр
+    сериализатора проверяет все строки, как child у ListSerializer.
+    """
+    serializer = RecipeRecordSerializer()
+    for number, line in enumerate(lines, start=1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            data = json.loads(line)
+        except ValueError as error:
+            yield number, None, {'non_field_errors': [str(error)]}
+            continue
+        try:
+            yield number, serializer.run_validation(data), None
+        except ValidationError as error:
+            yield number, None, error.detail
+
+
+class RecipeImporter:
+    """
+    Загрузка NDJSON-выгрузки рецептов пачками по batch_size строк, каждая
+    пачка - в своей транзакции. Рецепт ищется по автору и названию:
+    найденный обновляется (теги и ингредиенты заменяются целиком),
+    остальные создаются. Незнакомые ингредиенты добавляются в каталог,
+    а записи с неизвестным автором или тегом пропускаются с ошибкой.
+    """
+
+    FIELDS = ('text', 'image', 'image_variants', 'cooking_time',
+              'search_document')
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.totals = Counter(created=0, updated=0, failed=0)
+        self.errors = []
+        self.ingredients_created = False
+
+    def run(self, lines):
+        for batch in chunked(parse_lines(lines), self.batch_size):
+            records = []
+            for number, record, errors in batch:
+                if errors:
+                    self.error(number, errors)
+                else:
+                    records.append((number, record))
+            if records:
+                self.load(records)
+        if self.ingredients_created:
+            bump_version('ingredients')
+        if self.totals['created'] or self.totals['updated']:
+            bump_version('recipes')
+        errors = sorted(self.errors, key=lambda error: error['line'])
+        return {**self.totals, 'errors': errors}
+
+    def error(self, number, errors):
+        self.totals['failed'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': number, 'errors': errors})
+
+    @transaction.atomic
+    def load(self, records):
+        authors = dict(User.objects.filter(
+            username__in={record['author'] for _, record in records}
+        ).values_list('username', 'pk'))
+        tags = dict(Tag.objects.filter(
+            slug__in={slug for _, record in records
+                      for slug in record['tags']}
+        ).values_list('slug', 'pk'))
+        by_key, lines = {}, {}
+        for number, record in records:
+            errors = self.unknown(record, authors, tags)
+            key = authors.get(record['author']), record['name']
+            if not errors and key in by_key:
+                errors = {'name': [
+                    f'Рецепт {record["name"]} автора {record["author"]} '
+                    f'уже есть в строке {lines[key]}.']}
+            if errors:
+                self.error(number, errors)
+            else:
+                by_key[key] = record
+                lines[key] = number
+        if not by_key:
+            return
+        recipes, updated = self.save_recipes(by_key)
+        self.save_relations(recipes, by_key, tags, updated)
+
+    @staticmethod
+    def unknown(record, authors, tags):
+        errors = {}
+        if record['author'] not in authors:
+            errors['author'] = [f'Пользователь {record["author"]} не найден.']
+        missing = [slug for slug in record['tags'] if slug not in tags]
+        if missing:
+            errors['tags'] = [f'Теги не найдены: {", ".join(missing)}.']
+        return errors
+
+    def save_recipes(self, by_key):
+        """Создаем и обновляем рецепты пачки; возвращаем их по ключу."""
+        existing = {
+            (recipe.author_id, recipe.name): recipe
+            for recipe in Recipe.objects.filter(
+                author_id__in={key[0] for key in by_key},
+                name__in={key[1] for key in by_key},
+            )
+        }
+        new, updated, changed = [], [], []
+        for key, record in by_key.items():
+            recipe = existing.get(key)
+            if recipe is None:
+                new.append(Recipe(author_id=key[0], name=key[1]))
+                self.fill(new[-1], record)
+                continue
+            updated.append(recipe)
+            if recipe.image.name != record['image']:
+                recipe.image_variants = False
+            if self.fill(recipe, record):
+                changed.append(recipe)
+        recipes = {key: existing[key] for key in existing if key in by_key}
+        for recipe in bulk_create_with_pk(Recipe, new):
+            recipes[recipe.author_id, recipe.name] = recipe
+        dated = []
+        for key, recipe in recipes.items():
+            pub_date = by_key[key].get('pub_date')
+            if pub_date is not None and pub_date != recipe.pub_date:
+                recipe.pub_date = pub_date
+                dated.append(recipe)
+        Recipe.objects.bulk_update(changed, self.FIELDS,
+                                   batch_size=BATCH_SIZE)
+        Recipe.objects.bulk_update(dated, ('pub_date',),
+                                   batch_size=BATCH_SIZE)
+        self.totals['created'] += len(new)
+        self.totals['updated'] += len(updated)
+        return recipes, updated
+
+    def fill(self, recipe, record):
+        """Переносим поля записи в рецепт; True, если что-то изменилось."""
+        values = {
+            'text': record['text'],
+            'image': record['image'],
+            'cooking_time': record['cooking_time'],
+            'search_document': build_document(
+                record['name'], record['text'],
+                [item['name'] for item in record['ingredients']]),
+        }
+        changed = False
+        for field, value in values.items():
+            if getattr(recipe, field) != value:
+                setattr(recipe, field, value)
+                changed = True
+        return changed
+
+    def save_relations(self, recipes, by_key, tags, updated):
+        """Теги и ингредиенты рецептов пачки заменяем целиком."""
+        updated_ids = [recipe.pk for recipe in updated]
+        with deferred_cart_totals():
+            RecipeTag.objects.filter(recipe_id__in=updated_ids).delete()
+            RecipeIngredient.objects.filter(
+                recipe_id__in=updated_ids).delete()
+            ingredient_ids = self.ingredient_ids(by_key.values())
+            recipe_tags, recipe_ingredients = [], []
+            for key, record in by_key.items():
+                recipe = recipes[key]
+                recipe_tags.extend(
+                    RecipeTag(recipe=recipe, tag_id=tags[slug])
+                    for slug in dict.fromkeys(record['tags']))
+                amounts = Counter()
+                for item in record['ingredients']:
+                    amounts[ingredient_ids[
+                        item['name'], item['measurement_unit']]
+                    ] += item['amount']
+                recipe_ingredients.extend(
+                    RecipeIngredient(recipe=recipe, ingredient_id=pk,
+                                     amount=amount)
+                    for pk, amount in amounts.items())
+            RecipeTag.objects.bulk_create(recipe_tags, batch_size=BATCH_SIZE)
+            RecipeIngredient.objects.bulk_create(
+                recipe_ingredients, batch_size=BATCH_SIZE)
+            recipe_ingredients_changed(updated_ids)
+
+    def ingredient_ids(self, records):
+        """id ингредиентов записей; недостающие добавляем в каталог."""
+        keys = {(item['name'], item['measurement_unit'])
+                for record in records for item in record['ingredients']}
+        found = self.find_ingredients(keys)
+        missing = keys - found.keys()
+        if missing:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in missing),
+                batch_size=BATCH_SIZE, ignore_conflicts=True)
+            self.ingredients_created = True
+            found = self.find_ingredients(keys)
+        return found
+
+    @staticmethod
+    def find_ingredients(keys):
+        rows = Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit', 'pk')
+        return {(name, unit): pk for name, unit, pk in rows
+                if (name, unit) in keys}
@@ -0,0 +1,68 @@
+import random
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import record_cache
+
+VERSION_KEY = 'version:{}'
+
+
+def _initial_version():
+    """
+    Случайная стартовая версия: если ключ вытеснен из кеша, все процессы
+    получат новое значение и не примут устаревшие данные за актуальные.
+    """
+    return random.getrandbits(48)
+
+
+def get_version(name):
+    """Текущая версия набора данных name, общая для всех процессов."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    record_cache('version', hit=version is not None)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(*names):
+    """Версии нескольких наборов данных за одно обращение к кешу."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        record_cache('version', hit=key in found)
+        if key not in found:
+            cache.add(key, _initial_version(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return tuple(versions)
+
+
+def bump_version(name):
+    """Помечаем данные name измененными."""
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def bump_version_on_commit(name):
+    """
+    bump_version(name) после фиксации текущей транзакции. Повторные
+    вызовы в одной транзакции (сигналы на каждую строку каскадного
+    удаления) ставят одну задачу.
+    """
+    connection = transaction.get_connection()
+    if any(getattr(func, 'version_name', None) == name
+           for _, func in connection.run_on_commit):
+        return
+    bump = partial(bump_version, name)
+    bump.version_name = name
+    transaction.on_commit(bump)
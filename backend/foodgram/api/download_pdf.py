@@ -1,38 +1,104 @@
 import datetime
+import hashlib
 import io
+import os
+import threading
 
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib.utils import simpleSplit
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+from .metrics import record_cache
+from .profiling import timed
 
-def download_pdf(items):
-    buffer = io.BytesIO()
-    products_to_buy = canvas.Canvas(buffer)
+FONT_NAME = 'FreeSans'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'FreeSans.ttf')
+
+LEFT = 15
+TOP = 800
+BOTTOM = 40
+LINE_HEIGHT = 20
+MAX_WIDTH = 560
+CACHE_KEY = 'shopping_list_pdf:{}'
+
+_font_lock = threading.Lock()
+
+
+def register_font():
+    """Регистрируем шрифт один раз на процесс."""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    with _font_lock:
+        if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+class ShoppingListCanvas:
+    """Построчный вывод текста с переносом на новую страницу."""
+
+    def __init__(self, buffer):
+        self.canvas = canvas.Canvas(buffer)
+        self.line = TOP
+        self.font_size = 12
 
-    line = 800
-    pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
+    def set_font(self, size):
+        self.font_size = size
+        self.canvas.setFont(FONT_NAME, size)
 
-    products_to_buy.setFont('FreeSans', 16)
-    products_to_buy.drawString(15, line, "Список покупок:")
-    products_to_buy.setFont('FreeSans', 12)
-    line -= 20
+    def skip(self, height):
+        self.line -= height
+        if self.line < BOTTOM:
+            self.canvas.showPage()
+            self.canvas.setFont(FONT_NAME, self.font_size)
+            self.line = TOP
+
+    def write(self, text, height=LINE_HEIGHT):
+        for part in simpleSplit(text, FONT_NAME, self.font_size, MAX_WIDTH):
+            self.skip(height)
+            self.canvas.drawString(LEFT, self.line, part)
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+def render_pdf(items, today):
+    buffer = io.BytesIO()
+    products_to_buy = ShoppingListCanvas(buffer)
+    products_to_buy.set_font(16)
+    products_to_buy.write('Список покупок:', height=0)
+    products_to_buy.set_font(12)
+    products_to_buy.skip(20)
     for item in items:
-        line -= 20
-        to_print = f'{item}'
-        products_to_buy.drawString(15, line, to_print.capitalize())
-    line -= 55
-    products_to_buy.setFont('FreeSans', 10)
-    today = datetime.date.today()
-    products_to_buy.drawString(
-        15, line, 'From FoodGram:  Приятных покупок!'
-    )
-    line -= 20
-    products_to_buy.setFont('FreeSans', 9)
-    products_to_buy.drawString(15, line, F'{today}')
-
-    products_to_buy.showPage()
+        products_to_buy.write(f'{item}'.capitalize())
+    products_to_buy.set_font(10)
+    products_to_buy.write('From FoodGram:  Приятных покупок!', height=55)
+    products_to_buy.set_font(9)
+    products_to_buy.write(f'{today}')
     products_to_buy.save()
+    return buffer.getvalue()
+
 
-    buffer.seek(0)
-    return buffer
+def download_pdf(items):
+    """
+    PDF со списком покупок. Готовый файл кешируется по хешу содержимого
+    корзины, поэтому повторная загрузка неизмененной корзины не
+    перерисовывает документ.
+    """
+    items = list(items)
+    today = datetime.date.today()
+    digest = hashlib.sha256(
+        '\n'.join([str(today), *map(str, items)]).encode()
+    ).hexdigest()
+    key = CACHE_KEY.format(digest)
+    content = cache.get(key)
+    record_cache('pdf', hit=content is not None)
+    if content is None:
+        with timed('pdf'):
+            register_font()
+            content = render_pdf(items, today)
+        cache.set(key, content, settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT)
+    return io.BytesIO(content)
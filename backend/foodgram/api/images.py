@@ -0,0 +1,133 @@
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from dish_recipes.models import Recipe
+
+from .caching import bump_version
+
+VARIANTS_DIR = 'variants'
+# Вариант: (расширение, формат Pillow, уменьшать ли до миниатюры).
+VARIANTS = {
+    'thumbnail': ('jpg', 'JPEG', True),
+    'thumbnail_webp': ('webp', 'WEBP', True),
+    'webp': ('webp', 'WEBP', False),
+}
+QUALITY = 80
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Base64-изображение с лимитами. Размер проверяем по длине base64 до
+    декодирования, стороны - по заголовку файла до проверки целостности.
+    В запросе остаются только base64-декодирование и verify() Pillow:
+    битый файл нужно отклонить до сохранения рецепта. Пиксели целиком
+    декодируются только в фоне, в generate_image_variants.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            encoded = data.split(';base64,', 1)[-1]
+            if len(encoded) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(
+                    'Изображение больше '
+                    f'{settings.RECIPE_IMAGE_MAX_SIZE // 1024} КБ.')
+        return super().to_internal_value(data)
+
+    def get_file_extension(self, filename, decoded_file):
+        """Формат и стороны читаем из заголовка, не декодируя пиксели."""
+        limit = settings.RECIPE_IMAGE_MAX_DIMENSION
+        message = f'Стороны изображения должны быть не больше {limit} px.'
+        try:
+            image = Image.open(io.BytesIO(decoded_file))
+        except Image.DecompressionBombError:
+            raise serializers.ValidationError(message)
+        except OSError:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if max(image.size) > limit:
+            raise serializers.ValidationError(message)
+        extension = (image.format or '').lower()
+        return 'jpg' if extension == 'jpeg' else extension
+
+
+def variant_name(image_name, variant):
+    """Путь варианта рядом с оригиналом: <каталог>/variants/<имя>.<вид>."""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    extension = VARIANTS[variant][0]
+    return posixpath.join(directory, VARIANTS_DIR,
+                          f'{stem}.{variant}.{extension}')
+
+
+def variant_names(image_name):
+    return [variant_name(image_name, variant) for variant in VARIANTS]
+
+
+def image_url(recipe, variant=None):
+    """URL изображения рецепта; пока варианты не готовы - оригинал."""
+    name = str(recipe.image)
+    if variant is not None and recipe.image_variants:
+        name = variant_name(name, variant)
+    return '/media/' + name
+
+
+def render_variant(image, variant):
+    extension, image_format, thumbnail = VARIANTS[variant]
+    result = image.copy()
+    if thumbnail:
+        size = settings.RECIPE_THUMBNAIL_SIZE
+        result.thumbnail((size, size))
+    if image_format == 'JPEG' and result.mode != 'RGB':
+        result = result.convert('RGB')
+    elif result.mode not in ('RGB', 'RGBA'):
+        result = result.convert('RGBA')
+    buffer = io.BytesIO()
+    result.save(buffer, image_format, quality=QUALITY)
+    return buffer.getvalue()
+
+
+def delete_image_variants(image_name):
+    """
+    Варианты прежнего изображения рецепта. Удаляем их, только если на
+    изображение больше не ссылается ни один рецепт.
+    """
+    if not image_name or Recipe.objects.filter(image=image_name).exists():
+        return 0
+    deleted = 0
+    for name in variant_names(image_name):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def generate_image_variants(recipe_id, bump=True):
+    """
+    Миниатюры и WebP для изображения рецепта. Выполняется в фоне;
+    признак готовности ставим, только если изображение не сменилось.
+    С bump=False версию ленты рецептов увеличивает вызывающий код -
+    один раз на всю пачку.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return False
+    with default_storage.open(recipe.image.name) as file:
+        image = Image.open(file)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    for variant in VARIANTS:
+        name = variant_name(recipe.image.name, variant)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(render_variant(image, variant)))
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name).update(image_variants=True)
+    if updated and bump:
+        bump_version('recipes')
+    return bool(updated)
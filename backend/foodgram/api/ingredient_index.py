@@ -0,0 +1,124 @@
+import bisect
+import threading
+from collections import Counter, defaultdict
+
+from dish_recipes.models import Ingredient
+
+from .caching import get_version
+
+VERSION_NAME = 'ingredients'
+FUZZY_LIMIT = 10
+FUZZY_THRESHOLD = 0.25
+
+
+def normalize(value):
+    """Приводим строку к виду, в котором ищем: регистр, ё, пробелы."""
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def trigrams(value, padded=True):
+    """Триграммы строки; с отступами, как в pg_trgm."""
+    if padded:
+        value = f'  {value} '
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class IndexSnapshot:
+    """Неизменяемый срез индекса: отсортированные названия и триграммы."""
+
+    def __init__(self, rows):
+        self.entries = sorted(
+            (normalize(name), pk, name, unit) for pk, name, unit in rows
+        )
+        self.keys = [entry[0] for entry in self.entries]
+        postings = defaultdict(set)
+        for position, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                postings[trigram].add(position)
+        self.postings = dict(postings)
+
+    def prefix_matches(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(query):
+            end += 1
+        return list(range(start, end))
+
+    def substring_matches(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.keys))
+        else:
+            postings = [self.postings.get(trigram, set())
+                        for trigram in trigrams(query, padded=False)]
+            candidates = set.intersection(*postings)
+        matches = []
+        for position in candidates:
+            index = self.keys[position].find(query)
+            if index > 0:
+                matches.append((index, position))
+        return [position for _, position in sorted(matches)]
+
+    def fuzzy_matches(self, query, exclude):
+        if len(query) < 3:
+            return []
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.postings.get(trigram, ()))
+        scored = []
+        for position, count in shared.items():
+            score = count / len(query_trigrams)
+            if (count > 1 and score >= FUZZY_THRESHOLD
+                    and position not in exclude):
+                scored.append((-score, position))
+        return [position for _, position in sorted(scored)[:FUZZY_LIMIT]]
+
+    def serialize(self, position):
+        _, pk, name, unit = self.entries[position]
+        return {'id': pk, 'name': name, 'measurement_unit': unit}
+
+
+class IngredientIndex:
+    """
+    Поисковый индекс названий ингредиентов в памяти процесса.
+
+    Выдача ранжируется так: сначала названия, начинающиеся с запроса,
+    затем содержащие его, затем похожие (опечатки) по триграммам.
+    Индекс перестраивается, когда меняется общая для всех процессов
+    версия ингредиентов в кеше, поэтому воркеры gunicorn не расходятся.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+
+    def snapshot(self):
+        """Актуальный срез индекса; при смене версии строим новый."""
+        version = get_version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._snapshot = IndexSnapshot(
+                        Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit'))
+                    self._version = version
+        return self._snapshot
+
+    def search(self, query):
+        snapshot = self.snapshot()
+        query = normalize(query)
+        if not query:
+            return []
+        prefix = snapshot.prefix_matches(query)
+        found = set(prefix)
+        substring = [position
+                     for position in snapshot.substring_matches(query)
+                     if position not in found]
+        found.update(substring)
+        fuzzy = snapshot.fuzzy_matches(query, found)
+        return [snapshot.serialize(position)
+                for position in prefix + substring + fuzzy]
+
+
+ingredient_index = IngredientIndex()
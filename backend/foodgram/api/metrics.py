@@ -0,0 +1,298 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FILE_PATTERN = 'metrics_{}.json'
+LOCK_PATTERN = 'metrics_{}.lock'
+ARCHIVE = FILE_PATTERN.format('archive')
+COMPACT_LOCK = 'compact.lock'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Число запросов по маршрутам.', None),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время ответа, с.', DURATION_BUCKETS),
+    'foodgram_request_queries': (
+        'histogram', 'SQL-запросов на запрос.', QUERIES_BUCKETS),
+    'foodgram_response_size_bytes': (
+        'histogram', 'Размер ответа, байт.', SIZE_BUCKETS),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешу: hit или miss.', None),
+}
+
+
+class Registry:
+    """
+    Метрики процесса в памяти. Каждый воркер gunicorn периодически
+    сбрасывает свои значения в собственный файл METRICS_DIR, а при
+    чтении файлы всех воркеров суммируются, поэтому общий счет верен
+    без внешнего сервиса. Имя файла - pid и время запуска процесса:
+    воркер с тем же pid после перезапуска не затрет чужие значения.
+    Пока процесс жив, он держит блокировку на своем файле .lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lock_file = None
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.name = f'{self.pid}_{int(time.time() * 1000)}'
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = 0
+        if self.lock_file is not None:
+            # После fork блокировка остается за родителем, его
+            # дескриптор закрытие копии не затрагивает.
+            self.lock_file.close()
+            self.lock_file = None
+
+    def check_pid(self):
+        """После fork начинаем с нуля: данные родителя в его файле."""
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.check_pid()
+            self.counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            self.check_pid()
+            histogram = self.histograms.setdefault(
+                (name, labels), [[0] * len(buckets), 0.0, 0])
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dump(self.counters, self.histograms)
+
+    def hold_lock(self, directory):
+        """Блокировка файла процесса: по ней сборщик видит, что он жив."""
+        if self.lock_file is not None:
+            return
+        self.lock_file = open(
+            os.path.join(directory, LOCK_PATTERN.format(self.name)), 'w')
+        if fcntl is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def flush(self, force=False):
+        """Пишем значения процесса в его файл не чаще интервала."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        self.hold_lock(settings.METRICS_DIR)
+        write(os.path.join(settings.METRICS_DIR,
+                           FILE_PATTERN.format(self.name)), self.snapshot())
+
+
+def dump(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value
+                     in counters.items()],
+        'histograms': [[name, labels, *value] for (name, labels), value
+                       in histograms.items()],
+    }
+
+
+def write(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+def load(path, counters, histograms):
+    """Прибавляем значения из файла path; битый файл пропускаем."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return False
+    for name, labels, value in data['counters']:
+        counters[name, tuple(map(tuple, labels))] += value
+    for name, labels, buckets, total, count in data['histograms']:
+        key = name, tuple(map(tuple, labels))
+        current = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        current[0] = [a + b for a, b in zip(current[0], buckets)]
+        current[1] += total
+        current[2] += count
+    return True
+
+
+def is_alive(path):
+    """Процесс-владелец файла жив, если держит блокировку его .lock."""
+    lock_path = path[:-len('.json')] + '.lock'
+    try:
+        descriptor = os.open(lock_path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(descriptor)
+    return False
+
+
+def compact(directory):
+    """
+    Файлы завершившихся процессов сливаем в общий архив и удаляем,
+    чтобы они не копились. Без fcntl (Windows) файлы не сжимаются.
+    """
+    if fcntl is None:
+        return
+    with open(os.path.join(directory, COMPACT_LOCK), 'w') as guard:
+        fcntl.flock(guard, fcntl.LOCK_EX)
+        archive = os.path.join(directory, ARCHIVE)
+        dead = [path for path in glob.glob(
+                    os.path.join(directory, FILE_PATTERN.format('*')))
+                if path != archive and not is_alive(path)]
+        if not dead:
+            return
+        counters = defaultdict(float)
+        histograms = {}
+        load(archive, counters, histograms)
+        dead = [path for path in dead if load(path, counters, histograms)]
+        write(archive, dump(counters, histograms))
+        for path in dead:
+            os.remove(path)
+            try:
+                os.remove(path[:-len('.json')] + '.lock')
+            except FileNotFoundError:
+                pass
+
+
+registry = Registry()
+
+
+@atexit.register
+def flush_on_exit():
+    if settings.configured and settings.METRICS_ENABLED and (
+            registry.counters or registry.histograms):
+        registry.flush(force=True)
+
+
+def record_request(route, method, status, duration, queries, size):
+    labels = (('route', route),)
+    if method not in METHODS:
+        method = 'other'
+    registry.inc('foodgram_requests_total',
+                 labels + (('method', method), ('status', str(status))))
+    registry.observe('foodgram_request_duration_seconds', labels, duration)
+    registry.observe('foodgram_request_queries', labels, queries)
+    registry.observe('foodgram_response_size_bytes', labels, size)
+    registry.flush()
+
+
+def record_cache(cache_name, hit):
+    """Попадание или промах кеша cache_name (если метрики включены)."""
+    if settings.METRICS_ENABLED:
+        registry.inc('foodgram_cache_requests_total',
+                     (('cache', cache_name),
+                      ('result', 'hit' if hit else 'miss')))
+
+
+def collect():
+    """
+    Сумма метрик всех процессов из файлов METRICS_DIR и архива
+    завершившихся: счетчики монотонны, как в multiprocess-режиме
+    prometheus_client.
+    """
+    registry.flush(force=True)
+    compact(settings.METRICS_DIR)
+    counters = defaultdict(float)
+    histograms = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR,
+                                       FILE_PATTERN.format('*'))):
+        load(path, counters, histograms)
+    return counters, histograms
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def render(counters, histograms):
+    """Метрики в текстовом формате Prometheus."""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} '
+                                 f'{format_number(value)}')
+            continue
+        for (metric, labels), (counts, total, count) in sorted(
+                histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket'
+                             f'{format_labels(labels + (("le", bound),))} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket'
+                         f'{format_labels(labels + (("le", "+Inf"),))} '
+                         f'{count}')
+            lines.append(f'{name}_sum{format_labels(labels)} '
+                         f'{format_number(total)}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    /api/metrics: метрики всех воркеров для Prometheus. При заданном
+    METRICS_TOKEN нужен заголовок Authorization: Bearer <токен>.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(*collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,150 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import record_request
+from .profiling import (RequestTimings, collect_timings,
+                        wrapped_connections)
+
+logger = logging.getLogger('foodgram.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Замер запроса: число SQL-запросов и время в БД, сериализаторах,
+    отрисовке PDF и всего. Результат отдается заголовком Server-Timing
+    и строкой JSON в логе foodgram.performance; запросы, в которых SQL
+    больше PERFORMANCE_QUERY_THRESHOLD, пишутся предупреждением.
+    Для потоковых ответов заголовок покрывает работу до начала ответа,
+    а в лог попадает весь запрос вместе с чтением тела.
+    Без PERFORMANCE_TIMING middleware отключается при старте.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with self.measure() as timings:
+            response = self.get_response(request)
+        response['Server-Timing'] = self.server_timing(
+            timings, time.perf_counter() - started)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, timings,
+                started)
+        else:
+            self.finish(request, response, timings, started)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def measure(timings=None):
+        """Сбор замеров и счетчик SQL на всех подключениях к БД."""
+        with collect_timings(timings) as timings, wrapped_connections(
+                timings.execute_wrapper):
+            yield timings
+
+    def stream(self, request, response, content, timings, started):
+        """
+        Тело потокового ответа читается уже после выхода из view, поэтому
+        его запросы и сериализация досчитываются здесь, а строка лога
+        пишется при закрытии потока. Заголовок Server-Timing уходит
+        раньше тела и показывает только работу до начала ответа.
+        """
+        try:
+            with self.measure(timings):
+                yield from content
+        finally:
+            self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        timings.spans['total'] = (time.perf_counter() - started) * 1000
+        self.log(request, response, timings)
+
+    @staticmethod
+    def server_timing(timings, total):
+        metrics = [f'db;dur={timings.spans["db"]:.1f};'
+                   f'desc="{timings.queries} queries"']
+        metrics.extend(
+            f'{name};dur={duration:.1f}'
+            for name, duration in timings.spans.items() if name != 'db')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    @staticmethod
+    def log(request, response, timings):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{f'{name}_ms': round(duration, 1)
+               for name, duration in timings.spans.items()},
+        }
+        if timings.queries > settings.PERFORMANCE_QUERY_THRESHOLD:
+            record['too_many_queries'] = True
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """
+    Метрики для /api/metrics: число запросов, время ответа, число SQL и
+    размер ответа по имени маршрута DRF (recipes-list, users-subscriptions
+    и т.п.). Запросы к несуществующим адресам идут под маршрутом
+    unmatched, чтобы число рядов не зависело от клиентов. Без
+    METRICS_ENABLED middleware отключается при старте.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timings = RequestTimings()
+        with wrapped_connections(timings.execute_wrapper):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, timings,
+                started)
+        else:
+            self.finish(request, response, timings, started,
+                        len(response.content))
+        return response
+
+    def stream(self, request, response, content, timings, started):
+        """
+        Потоковый ответ учитывается при закрытии потока: время и SQL
+        вместе с чтением тела, размер - по отданным байтам.
+        """
+        size = 0
+        try:
+            with wrapped_connections(timings.execute_wrapper):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.finish(request, response, timings, started, size)
+
+    def finish(self, request, response, timings, started, size):
+        record_request(self.route(request), request.method,
+                       response.status_code, time.perf_counter() - started,
+                       timings.queries, size)
+
+    @staticmethod
+    def route(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.url_name or match.view_name
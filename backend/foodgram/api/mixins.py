@@ -1,7 +1,160 @@
-from rest_framework import mixins, permissions, viewsets
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.renderers import JSONRenderer
+
+from .caching import get_version, get_versions
+from .metrics import record_cache
+from .pagination import KeysetPagination
+
+
+def normalized_query(request):
+    """
+    Параметры запроса в каноническом виде: порядок параметров и
+    повторяющихся значений (tags=a&tags=b) не влияет на ключ кеша.
+    """
+    return sorted((name, sorted(values))
+                  for name, values in request.query_params.lists())
 
 
 class ListRetrieveViewSet(mixins.RetrieveModelMixin,
                           mixins.ListModelMixin,
                           viewsets.GenericViewSet):
     permission_classes = [permissions.AllowAny]
+
+
+class KeysetPaginationMixin:
+    """
+    Keyset-пагинация по запросу: с параметром cursor (в том числе пустым,
+    для первой страницы) действие из keyset_pagination_classes листает
+    своим keyset-классом, иначе остается постраничная пагинация.
+    """
+    keyset_pagination_classes = {}
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            keyset_class = self.keyset_pagination_classes.get(self.action)
+            if (keyset_class is not None
+                    and KeysetPagination.cursor_query_param
+                    in self.request.query_params):
+                self._paginator = keyset_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
+class CachedListRetrieveViewSet(ListRetrieveViewSet):
+    """
+    Справочные данные: готовый JSON хранится в кеше под версией данных,
+    ответ снабжается ETag, и клиент может перепроверить его запросом
+    с If-None-Match, получив 304 без тела.
+    """
+    cache_version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, build, *args, **kwargs):
+        version = get_version(self.cache_version_name)
+        key = (f'response:{self.cache_version_name}:{version}:'
+               f'{request.path}:{normalized_query(request)}')
+        etag = '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+        if etag in self.client_etags(request):
+            record_cache(self.cache_version_name, hit=True)
+            return self.with_cache_headers(HttpResponseNotModified(), etag)
+        content = cache.get(key)
+        record_cache(self.cache_version_name, hit=content is not None)
+        if content is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, settings.REFERENCE_DATA_CACHE_TIMEOUT)
+        return self.with_cache_headers(
+            HttpResponse(content, content_type='application/json'), etag)
+
+    @staticmethod
+    def client_etags(request):
+        header = request.META.get('HTTP_IF_NONE_MATCH', '')
+        return {tag.strip().replace('W/', '', 1)
+                for tag in header.split(',') if tag.strip()}
+
+    @staticmethod
+    def with_cache_headers(response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_DATA_MAX_AGE}')
+        return response
+
+
+class AnonymousCacheMixin:
+    """
+    Для анонимных посетителей ответы list и retrieve зависят только от
+    параметров запроса (признаки избранного и корзины у них всегда
+    false), поэтому готовые данные хранятся в кеше под версиями наборов
+    anonymous_cache_versions. Версии увеличивают сигналы и массовые
+    операции, так что ключ устаревших данных просто перестает
+    запрашиваться. Часто меняющиеся поля anonymous_live_fields (счетчики)
+    в кеш не попадают в актуальном виде: при чтении они подставляются
+    из базы одним запросом по id объектов ответа. Авторизованным ответ
+    собирается как обычно.
+    """
+    anonymous_cache_versions = ()
+    anonymous_live_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.anonymous_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.anonymous_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def anonymous_response(self, request, build, *args, **kwargs):
+        if request.user.is_authenticated:
+            return build(request, *args, **kwargs)
+        versions = '-'.join(
+            map(str, get_versions(*self.anonymous_cache_versions)))
+        address = (f'{request.build_absolute_uri(request.path)}'
+                   f'{normalized_query(request)}')
+        key = (f'anonymous:{self.basename}:{versions}:'
+               f'{hashlib.md5(address.encode()).hexdigest()}')
+        data = cache.get(key)
+        record_cache(f'anonymous_{self.basename}', hit=data is not None)
+        if data is None:
+            response = build(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.ANONYMOUS_CACHE_TIMEOUT)
+        else:
+            self.refresh_live_fields(data)
+        return HttpResponse(JSONRenderer().render(data),
+                            content_type='application/json')
+
+    def refresh_live_fields(self, data):
+        """Подставляем в закешированные данные текущие живые поля."""
+        if not self.anonymous_live_fields:
+            return
+        if isinstance(data, dict):
+            items = data.get('results', [data])
+        else:
+            items = data
+        if not items:
+            return
+        values = {
+            row.pop('pk'): row
+            for row in self.queryset.model.objects.filter(
+                pk__in=[item['id'] for item in items]).values(
+                    'pk', *self.anonymous_live_fields)}
+        for item in items:
+            item.update(values.get(item['id'], {}))
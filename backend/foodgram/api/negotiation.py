@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """
+    Параметр ?format обрабатывает само представление (формат файла),
+    поэтому рендерер DRF выбираем без его учета.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
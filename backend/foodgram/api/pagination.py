@@ -1,5 +1,152 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+MAX_PAGE_SIZE = 100
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация: страница выбирается условием по ключу сортировки,
+    а не OFFSET, и без COUNT(*), поэтому глубокие страницы не медленнее
+    первых, а новые записи не сдвигают уже просмотренные. Курсоры
+    next/previous непрозрачны: это base64 от значений ключа на границе
+    страницы и направления обхода. Ключ берется из view.get_ordering(),
+    если представление задает сортировку, иначе из ordering.
+    """
+    ordering = ('-pub_date', '-id')
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        rows = list(self.get_page_queryset(queryset, request, view))
+        has_more = len(rows) > page_size
+        self.page = rows[:page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """
+        Выборка страницы (на одну строку больше, чтобы узнать о следующей)
+        без выполнения: ее же разбирает explain_queries.
+        """
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.position, self.reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.after(ordering, self.position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset[:self.get_page_size(request) + 1]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_ordering(self, view):
+        get_ordering = getattr(view, 'get_ordering', None)
+        return (get_ordering and get_ordering()) or self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, row, reverse):
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.cursor_for(row, self.ordering, reverse))
+
+    @staticmethod
+    def cursor_for(row, ordering, reverse=False):
+        """Непрозрачный курсор на позицию row в сортировке ordering."""
+        position = []
+        for field in ordering:
+            value = getattr(row, field.lstrip('-'))
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            position.append(value)
+        return base64.urlsafe_b64encode(json.dumps(
+            {'p': position, 'r': reverse}).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position, reverse = data['p'], bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, position):
+        """Условие "строго после position" для сортировки ordering."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+
+class FollowKeysetPagination(KeysetPagination):
+    """Keyset-пагинация подписок в порядке их оформления."""
+    ordering = ('id',)
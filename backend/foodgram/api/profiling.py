@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Замеры одного запроса: SQL-запросы и время по участкам, в мс."""
+
+    def __init__(self):
+        self.queries = 0
+        self.spans = defaultdict(float, db=0.0)
+        self.active = set()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper: считает запросы и их время."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.spans['db'] += (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def wrapped_connections(wrapper):
+    """Обертка wrapper на execute всех подключений к базам внутри блока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def current_timings():
+    """Замеры текущего запроса или None, если замер выключен."""
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def collect_timings(timings=None):
+    """
+    Включаем сбор замеров для кода внутри блока в текущем потоке.
+    Переданные timings продолжают начатый замер - так досчитывается
+    потоковый ответ после выхода из view.
+    """
+    if timings is None:
+        timings = RequestTimings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        _local.timings = None
+
+
+@contextmanager
+def timed(name):
+    """
+    Время блока прибавляется к участку name текущего запроса. Вложенные
+    блоки с тем же именем (сериализатор внутри сериализатора) не
+    учитываются повторно.
+    """
+    timings = current_timings()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.spans[name] += (time.perf_counter() - started) * 1000
+        timings.active.discard(name)
+
+
+class TimedSerializerMixin:
+    """Время сериализации и проверки данных - участок serializer."""
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+    def run_validation(self, data):
+        with timed('serializer'):
+            return super().run_validation(data)
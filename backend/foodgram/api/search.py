@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Func, Value
+from django.db.models.functions import StrIndex
+
+from dish_recipes.models import Recipe, RecipeIngredient
+from dish_recipes.utils import BATCH_SIZE
+
+from .ingredient_index import normalize
+
+SEARCH_CONFIG = 'russian'
+
+
+class RussianTsVector(Func):
+    """to_tsvector('russian', ...) - то же выражение, что в GIN-индексе."""
+    function = 'to_tsvector'
+    template = f"%(function)s('{SEARCH_CONFIG}', %(expressions)s)"
+
+
+def build_document(name, text, ingredient_names):
+    """
+    Поисковый документ рецепта: название, описание и названия
+    ингредиентов в нормализованном виде. Название идет первым.
+    """
+    return '\n'.join(normalize(part)
+                     for part in (name, text, *ingredient_names))
+
+
+def refresh_search_documents(recipes):
+    """Пересобираем поисковые документы рецептов пачками."""
+    names = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(recipe__in=recipes).values_list(
+        'recipe_id', 'ingredient__name').order_by('pk')
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    changed = []
+    for recipe in Recipe.objects.filter(pk__in=recipes).only(
+            'id', 'name', 'text', 'search_document'):
+        document = build_document(recipe.name, recipe.text, names[recipe.pk])
+        if document != recipe.search_document:
+            recipe.search_document = document
+            changed.append(recipe)
+    Recipe.objects.bulk_update(changed, ('search_document',),
+                               batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def search_recipes(queryset, query):
+    """
+    Рецепты, подходящие под запрос, по убыванию релевантности. На
+    PostgreSQL - полнотекстовый поиск по GIN-индексу с ts_rank, на
+    остальных базах - вхождение каждого слова, совпадения в названии
+    выше.
+    """
+    words = normalize(query).split()
+    if not words:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _search_postgres(queryset, ' '.join(words))
+    return _search_fallback(queryset, words)
+
+
+def _search_postgres(queryset, query):
+    from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                SearchVectorField)
+    vector = RussianTsVector('search_document',
+                             output_field=SearchVectorField())
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    return queryset.annotate(
+        search_vector=vector,
+        search_rank=SearchRank(vector, search_query),
+    ).filter(search_vector=search_query).order_by(
+        '-search_rank', '-pub_date', '-id')
+
+
+def _search_fallback(queryset, words):
+    for word in words:
+        queryset = queryset.filter(search_document__contains=word)
+    return queryset.annotate(
+        search_position=StrIndex('search_document', Value(words[0]))
+    ).order_by('search_position', '-pub_date', '-id')
@@ -1,17 +1,84 @@
+import os
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework.relations import PrimaryKeyRelatedField, SlugRelatedField
+from rest_framework.reverse import reverse
+from rest_framework.relations import SlugRelatedField
 from rest_framework.validators import UniqueTogetherValidator
 
-from dish_recipes.models import (FavoritesRecipe, Follow, Ingredient,
-                                 IngredientAmount, Recipe, RecipeTag, ShopList,
-                                 Tag)
+from dish_recipes.models import (FavoritesRecipe, Follow, Ingredient, Recipe,
+                                 RecipeIngredient, RecipeTag, ShopList,
+                                 ShoppingListExport, Tag)
+from dish_recipes.utils import BATCH_SIZE
+
+from .images import (RecipeImageField, delete_image_variants,
+                     generate_image_variants, image_url)
+from .profiling import TimedSerializerMixin
+from .search import build_document
+from .tasks import run_in_background
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def resolve_ids(queryset, ids):
+    """
+    Находим объекты по списку id одним запросом IN. Повторы и
+    несуществующие id отклоняем за один проход.
+    """
+    duplicates = sorted(pk for pk, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        raise serializers.ValidationError(
+            f'Значения повторяются: {duplicates}.')
+    found = queryset.in_bulk(ids)
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        raise serializers.ValidationError(
+            f'Объекты не найдены: {missing}.')
+    return found
+
+
+def recipes_limit(request):
+    """Параметр recipes_limit; некорректное значение игнорируем."""
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список id объектов из queryset, проверяемый одним запросом."""
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        found = resolve_ids(self.queryset, ids)
+        return [found[pk] for pk in ids]
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
+
+class ImageVariantField(serializers.Field):
+    """URL миниатюры или WebP-варианта изображения рецепта."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return image_url(recipe, self.variant)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели пользователя."""
     password = serializers.CharField(write_only=True)
     is_subscribed = serializers.SerializerMethodField(read_only=True)
@@ -37,13 +104,15 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (bool(request) and
                 request.user.is_authenticated and
                 request.user.follower.filter(author=obj.id).exists())
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели тегов."""
 
     class Meta:
@@ -51,7 +120,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'slug', 'color')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели ингредиентов."""
 
     class Meta:
@@ -68,7 +137,7 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
     )
 
     class Meta:
-        model = IngredientAmount
+        model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
@@ -82,34 +151,57 @@ class RecipeTagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
+class AddIngredientAmountListSerializer(serializers.ListSerializer):
+    """Проверяем ингредиенты рецепта разом, одним запросом на весь список."""
+
+    def validate(self, attrs):
+        found = resolve_ids(Ingredient.objects.all(),
+                            [item['id'] for item in attrs])
+        for item in attrs:
+            item['id'] = found[item['id']]
+        return attrs
+
+
 class AddIngredientAmountSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления ингредиентов в рецепт."""
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
         fields = ('id', 'amount')
-        model = IngredientAmount
+        model = RecipeIngredient
+        list_serializer_class = AddIngredientAmountListSerializer
 
 
-class RecipeReadOnlySerializer(serializers.ModelSerializer):
+class RecipeReadOnlySerializer(TimedSerializerMixin,
+                               serializers.ModelSerializer):
     """Сериализатор для отображения рецептов."""
     image = serializers.SerializerMethodField('image_url')
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_thumbnail_webp = ImageVariantField('thumbnail_webp')
+    image_webp = ImageVariantField('webp')
     author = UserSerializer(read_only=True)
     tags = TagSerializer(source='tag', many=True, read_only=True)
     ingredients = IngredientAmountSerializer(
-        source='ingredient', many=True, read_only=True)
+        source='recipe_ingredients', many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text',
-                  'cooking_time')
+                  'is_favorited', 'is_in_shopping_cart', 'favorites_count',
+                  'name', 'image', 'image_thumbnail', 'image_thumbnail_webp',
+                  'image_webp', 'text', 'cooking_time')
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (bool(request) and
                 request.user.is_authenticated and
@@ -117,6 +209,8 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
                     user=request.user, recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (bool(request) and
                 request.user.is_authenticated and
@@ -124,20 +218,20 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
                     user=request.user, recipe=obj).exists())
 
     def image_url(self, obj):
-        return '/media/' + str(obj.image)
+        return image_url(obj)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор создания, обновления и удаления рецептов."""
-    image = Base64ImageField()
+    image = RecipeImageField()
     author = SlugRelatedField(slug_field='username',
                               default=serializers.CurrentUserDefault(),
                               read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True, source='tag',
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all(), source='tag',
     )
     ingredients = AddIngredientAmountSerializer(
-        many=True, source='ingredient')
+        many=True, source='recipe_ingredients')
 
     class Meta:
         model = Recipe
@@ -160,48 +254,119 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
-        image = validated_data.pop('image')
-        ingredients_data = validated_data.pop('ingredient')
+        ingredients_data = validated_data.pop('recipe_ingredients')
         tags_data = validated_data.pop('tag')
-        recipe = Recipe.objects.create(image=image, **validated_data)
-        recipe.tag.set(tags_data)
-        for ingredient in ingredients_data:
-            add_ingredient = IngredientAmount.objects.create(
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
-            recipe.ingredient.add(add_ingredient)
+        validated_data['search_document'] = self.search_document(
+            None, validated_data, ingredients_data)
+        recipe = Recipe.objects.create(**validated_data)
+        self.set_tags(recipe, tags_data, current=())
+        self.set_ingredients(recipe, ingredients_data, current={})
+        run_in_background(generate_image_variants, recipe.pk)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredient')
-        tags_data = validated_data.pop('tag')
+        ingredients_data = validated_data.pop('recipe_ingredients', None)
+        tags_data = validated_data.pop('tag', None)
+        if ingredients_data is not None or (
+                validated_data.keys() & {'name', 'text'}):
+            validated_data['search_document'] = self.search_document(
+                instance, validated_data, ingredients_data)
+        old_image = instance.image.name
+        if 'image' in validated_data:
+            validated_data['image_variants'] = False
         super().update(instance, validated_data)
-        IngredientAmount.objects.filter(recipes=instance).delete()
-        recipe = instance
-        for ingredient in ingredients_data:
-            ing = IngredientAmount.objects.create(
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
-            recipe.ingredient.add(ing)
-
-        instance.tag.set(tags_data)
-        return recipe
+        if tags_data is not None:
+            self.set_tags(instance, tags_data)
+        if ingredients_data is not None:
+            self.set_ingredients(instance, ingredients_data)
+        if 'image' in validated_data:
+            run_in_background(delete_image_variants, old_image)
+            run_in_background(generate_image_variants, instance.pk)
+        return instance
+
+    @staticmethod
+    def search_document(instance, validated_data, ingredients):
+        """
+        Поисковый документ собираем из уже проверенных данных, без
+        лишних запросов; ингредиенты читаем, только если их не меняли.
+        """
+        if ingredients is not None:
+            names = [item['id'].name for item in ingredients]
+        else:
+            names = instance.recipe_ingredients.order_by('pk').values_list(
+                'ingredient__name', flat=True)
+        return build_document(
+            validated_data.get('name', getattr(instance, 'name', '')),
+            validated_data.get('text', getattr(instance, 'text', '')),
+            names,
+        )
+
+    @staticmethod
+    def set_tags(recipe, tags, current=None):
+        """Добавляем и удаляем только изменившиеся теги рецепта."""
+        if current is None:
+            current = RecipeTag.objects.filter(
+                recipe=recipe).values_list('tag_id', flat=True)
+        current = set(current)
+        new = {tag.id for tag in tags}
+        if current - new:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - new).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new - current
+        )
+
+    @staticmethod
+    def set_ingredients(recipe, ingredients, current=None):
+        """
+        Сравниваем ингредиенты рецепта с новыми и пакетно удаляем,
+        обновляем или добавляем только то, что изменилось.
+        """
+        if current is None:
+            current = {item.ingredient_id: item
+                       for item in recipe.recipe_ingredients.all()}
+        new = {item['id'].id: item['amount'] for item in ingredients}
+        removed = [item.pk for ingredient_id, item in current.items()
+                   if ingredient_id not in new]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        changed = []
+        for ingredient_id, amount in new.items():
+            if (ingredient_id in current
+                    and current[ingredient_id].amount != amount):
+                current[ingredient_id].amount = amount
+                changed.append(current[ingredient_id])
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=amount)
+             for ingredient_id, amount in new.items()
+             if ingredient_id not in current),
+            batch_size=BATCH_SIZE,
+        )
 
 
-class FollowerRecipeSerializer(serializers.ModelSerializer):
+class FollowerRecipeSerializer(TimedSerializerMixin,
+                               serializers.ModelSerializer):
     """Вспомогательный сериализатор для рецептов в подписках."""
     image = serializers.SerializerMethodField('image_url')
+    image_thumbnail = ImageVariantField('thumbnail')
+    image_thumbnail_webp = ImageVariantField('thumbnail_webp')
 
     def image_url(self, obj):
-        return '/media/' + str(obj.image)
+        return image_url(obj)
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail',
+                  'image_thumbnail_webp', 'cooking_time')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для вывода всех подписок."""
     queryset = User.objects.all()
     user = serializers.PrimaryKeyRelatedField(queryset=queryset)
@@ -232,7 +397,8 @@ class FollowSerializer(serializers.ModelSerializer):
         return SubscriptionsSerializer(instance, context=context).data
 
 
-class SubscriptionsSerializer(serializers.ModelSerializer):
+class SubscriptionsSerializer(TimedSerializerMixin,
+                              serializers.ModelSerializer):
     """Сериализатор для подписки на пользователя."""
     id = serializers.ReadOnlyField(source='author.id')
     email = serializers.ReadOnlyField(source='author.email')
@@ -249,24 +415,23 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        """Сериализуем подписки самого пользователя: запрос не нужен."""
         request = self.context.get('request')
-        return (bool(request) and
-                request.user.is_authenticated and
-                Follow.objects.filter(
-                    user=obj.user, author=obj.author).exists())
+        return bool(request) and obj.user_id == request.user.id
 
     def get_recipes(self, obj):
-        params = self.context.get("request").query_params
-        limit = params.get('recipes_limit')
-        recipes = obj.author.recipes
-        if limit:
-            recipes = recipes.all()[:int(limit)]
-        context = {'request': self.context.get("request")}
+        request = self.context.get('request')
+        recipes = getattr(obj, 'author_recipes', None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()[:recipes_limit(request)]
+        context = {'request': request}
         return FollowerRecipeSerializer(
             recipes, context=context, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.author.recipes.count()
 
 
 class FavoritesSerializer(serializers.ModelSerializer):
@@ -308,3 +473,53 @@ class ShopListSerializer(serializers.ModelSerializer):
         context = {'request': request}
         return FollowerRecipeSerializer(
             instance.recipe, context=context).data
+
+
+class ShoppingListExportSerializer(TimedSerializerMixin,
+                                   serializers.ModelSerializer):
+    """Сериализатор статуса фоновой выгрузки списка покупок."""
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingListExport
+        fields = ('id', 'status', 'error', 'created', 'finished', 'download')
+
+    def get_download(self, obj):
+        if obj.status != ShoppingListExport.DONE:
+            return None
+        return reverse('api:shopping_list_exports-download', args=(obj.id,),
+                       request=self.context.get('request'))
+
+
+class RecordIngredientSerializer(serializers.Serializer):
+    """Ингредиент рецепта в строке NDJSON-выгрузки."""
+    name = serializers.CharField(max_length=200)
+    measurement_unit = serializers.CharField(max_length=200)
+    amount = serializers.IntegerField(min_value=1)
+
+
+class RecipeRecordSerializer(serializers.Serializer):
+    """
+    Строка NDJSON-выгрузки рецептов. Связи заданы не id, а естественными
+    ключами (username, slug, название и единица), чтобы выгрузку можно
+    было загрузить в другую базу; здесь проверяется форма записи и то,
+что изображение лежит в каталоге рецептов.
+    """
+    author = serializers.CharField(max_length=150)
+    name = serializers.CharField(max_length=200)
+    text = serializers.CharField()
+    image = serializers.CharField(max_length=100)
+    cooking_time = serializers.IntegerField(min_value=1)
+    pub_date = serializers.DateTimeField(required=False)
+    tags = serializers.ListField(child=serializers.SlugField(max_length=200))
+    ingredients = RecordIngredientSerializer(many=True, allow_empty=False)
+
+    def validate_image(self, value):
+        """Файл должен лежать в каталоге изображений рецептов MEDIA_ROOT."""
+        directory = os.path.realpath(os.path.join(
+            settings.MEDIA_ROOT, Recipe._meta.get_field('image').upload_to))
+        path = os.path.realpath(os.path.join(settings.MEDIA_ROOT, value))
+        if not path.startswith(directory + os.sep):
+            raise serializers.ValidationError(
+                'Изображение должно лежать в каталоге recipes/.')
+        return value
@@ -0,0 +1,190 @@
+import csv
+import json
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from dish_recipes.models import (RecipeIngredient, ShopList,
+                                 ShoppingCartTotal, ShoppingListExport)
+from dish_recipes.utils import BATCH_SIZE
+
+from .download_pdf import download_pdf
+
+NAME = 'ingredient__name'
+UNIT = 'ingredient__measurement_unit'
+
+_deferred = threading.local()
+
+
+def shopping_list_rows(user):
+    """Суммарное количество ингредиентов в корзине из итогов корзины."""
+    return ShoppingCartTotal.objects.filter(user=user).values(
+        NAME, UNIT, count=F('amount')
+    ).order_by(NAME, UNIT)
+
+
+@transaction.atomic(savepoint=False)
+def change_cart_totals(user_id, recipe_id, sign):
+    """
+    Прибавляем (sign=1) или вычитаем (sign=-1) ингредиенты рецепта
+    из итогов корзины пользователя.
+    """
+    deferred = getattr(_deferred, 'user_ids', None)
+    if deferred is not None:
+        deferred.add(user_id)
+        return
+    amounts = dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', 'amount')
+    )
+    if not amounts:
+        return
+    # Строки создаём заранее и игнорируем конфликт: параллельная транзакция
+    # могла вставить ту же пару (user, ingredient), а select_for_update
+    # отсутствующие строки не блокирует.
+    if sign > 0:
+        ShoppingCartTotal.objects.bulk_create(
+            (ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                               amount=0)
+             for ingredient_id in amounts),
+            ignore_conflicts=True,
+        )
+    totals = ShoppingCartTotal.objects.filter(
+        user_id=user_id, ingredient_id__in=amounts)
+    totals.update(amount=Greatest(F('amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(sign * amount))
+          for ingredient_id, amount in amounts.items()),
+        output_field=IntegerField(),
+    ), 0))
+    if sign < 0:
+        totals.filter(amount=0).delete()
+
+
+@transaction.atomic(savepoint=False)
+def rebuild_cart_totals(user_ids):
+    """Пересчитываем итоги корзин пользователей целиком."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ShoppingCartTotal.objects.filter(user_id__in=user_ids).delete()
+    rows = ShopList.objects.filter(
+        user_id__in=user_ids, recipe__recipe_ingredients__isnull=False
+    ).values_list(
+        'user', 'recipe__recipe_ingredients__ingredient'
+    ).annotate(
+        total=Sum('recipe__recipe_ingredients__amount')
+    ).order_by()
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=total)
+         for user_id, ingredient_id, total in rows),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def recipe_ingredients_changed(recipe_ids):
+    """
+    Ингредиенты рецептов изменились: пересчитываем корзины, в которых
+    лежат эти рецепты. Внутри deferred_cart_totals пересчет откладывается
+    до конца блока.
+    """
+    deferred = getattr(_deferred, 'recipe_ids', None)
+    if deferred is not None:
+        deferred.update(recipe_ids)
+        return
+    rebuild_cart_totals(ShopList.objects.filter(
+        recipe_id__in=recipe_ids).values_list('user_id', flat=True).distinct())
+
+
+@contextmanager
+def deferred_cart_totals():
+    """
+    Массовые и каскадные изменения: вместо пересчета итогов на каждую
+    строку корзины или рецепта запоминаем пользователей и рецепты и в той
+    же транзакции один раз пересчитываем затронутые корзины.
+    """
+    if getattr(_deferred, 'user_ids', None) is not None:
+        yield
+        return
+    _deferred.user_ids, _deferred.recipe_ids = set(), set()
+    try:
+        with transaction.atomic():
+            yield
+            user_ids, recipe_ids = _deferred.user_ids, _deferred.recipe_ids
+            _deferred.user_ids = _deferred.recipe_ids = None
+            if recipe_ids:
+                user_ids.update(ShopList.objects.filter(
+                    recipe_id__in=recipe_ids).values_list(
+                    'user_id', flat=True))
+            rebuild_cart_totals(user_ids)
+    finally:
+        _deferred.user_ids = _deferred.recipe_ids = None
+
+
+def format_row(row):
+    return f'{row[NAME]} -- {row["count"]} {row[UNIT]}'
+
+
+def shopping_list(user):
+    return [format_row(row) for row in shopping_list_rows(user)]
+
+
+class Echo:
+    """Псевдобуфер: csv.writer пишет в него и сразу получает строку."""
+
+    def write(self, value):
+        return value
+
+
+def stream_txt(rows):
+    for row in rows.iterator():
+        yield format_row(row) + '\n'
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows.iterator():
+        yield writer.writerow((row[NAME], row[UNIT], row['count']))
+
+
+def stream_json(rows):
+    separator = ''
+    yield '['
+    for row in rows.iterator():
+        yield separator + json.dumps({
+            'name': row[NAME],
+            'measurement_unit': row[UNIT],
+            'amount': row['count'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+STREAM_FORMATS = {
+    'txt': (stream_txt, 'text/plain; charset=utf-8'),
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'json': (stream_json, 'application/json'),
+}
+
+
+def export_shopping_list(export_id):
+    """Фоновая задача: формируем PDF для выгрузки export_id."""
+    export = ShoppingListExport.objects.select_related('user').get(
+        pk=export_id)
+    export.status = ShoppingListExport.RUNNING
+    export.save(update_fields=('status',))
+    try:
+        export.content = download_pdf(shopping_list(export.user)).getvalue()
+        export.status = ShoppingListExport.DONE
+    except Exception as error:
+        export.error = str(error)
+        export.status = ShoppingListExport.FAILED
+        raise
+    finally:
+        export.finished = timezone.now()
+        export.save(update_fields=('content', 'status', 'error', 'finished'))
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from dish_recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                 RecipeTag, ShopList, Tag)
+
+from .caching import bump_version_on_commit
+from .search import refresh_search_documents
+from .shopping_cart import change_cart_totals, recipe_ingredients_changed
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(instance, created, **kwargs):
+    if not created:
+        refresh_search_documents(
+            Recipe.objects.filter(ingredients=instance).values('pk'))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_deleted(instance, **kwargs):
+    recipe_ids = list(Recipe.objects.filter(
+        ingredients=instance).values_list('pk', flat=True))
+    if recipe_ids:
+        transaction.on_commit(
+            lambda: refresh_search_documents(recipe_ids))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tags_changed(**kwargs):
+    bump_version_on_commit('tags')
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeTag)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipes_changed(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(post_save, sender=User)
+def author_changed(created, update_fields, **kwargs):
+    """Профиль автора есть в ответах с рецептами; вход его не меняет."""
+    if not created and not (update_fields and set(update_fields) <= {
+            'last_login', 'password'}):
+        bump_version_on_commit('recipes')
+
+
+@receiver(post_delete, sender=User)
+def author_deleted(**kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(post_save, sender=ShopList)
+def recipe_added_to_cart(instance, created, **kwargs):
+    if created:
+        change_cart_totals(instance.user_id, instance.recipe_id, 1)
+
+
+@receiver(pre_delete, sender=ShopList)
+def recipe_removed_from_cart(instance, **kwargs):
+    change_cart_totals(instance.user_id, instance.recipe_id, -1)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    """Количество ингредиента в рецепте входит в итоги корзин с ним."""
+    recipe_ingredients_changed([instance.recipe_id])
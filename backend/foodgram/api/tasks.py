@@ -0,0 +1,47 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASKS_WORKERS,
+            thread_name_prefix='foodgram-task',
+        )
+    return _executor
+
+
+def _call(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__name__)
+
+
+def _run_in_thread(func, *args):
+    try:
+        _call(func, *args)
+    finally:
+        connection.close()
+
+
+def run_in_background(func, *args):
+    """
+    Выполняем func в пуле потоков процесса после коммита текущей
+    транзакции. При BACKGROUND_TASKS_EAGER задача выполняется сразу,
+    как в тестах.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        _call(func, *args)
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(_run_in_thread, func, *args))
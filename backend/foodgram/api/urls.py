@@ -1,8 +1,9 @@
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
+from .metrics import metrics_view
 from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+                    ShoppingListExportViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -12,8 +13,11 @@ router.register(r'users', CustomUserViewSet, basename='users')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
+router.register('shopping_list_exports', ShoppingListExportViewSet,
+                basename='shopping_list_exports')
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     re_path(r'^auth/', include('djoser.urls')),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
     path('', include(router.urls))
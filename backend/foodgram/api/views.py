@@ -1,58 +1,130 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import IntegrityError, transaction
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Value)
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from dish_recipes.models import (FavoritesRecipe, Ingredient, IngredientAmount,
-                                 Recipe, ShopList, Tag)
+from dish_recipes.models import (FavoritesRecipe, Follow, Ingredient, Recipe,
+                                 ShopList, ShoppingListExport, Tag)
+from dish_recipes.utils import favorites_count_refreshed
 
+from .bulk import CONTENT_TYPE, RecipeImporter, export_recipes
 from .download_pdf import download_pdf
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import ListRetrieveViewSet
-from .pagination import CustomPagination
+from .ingredient_index import ingredient_index
+from .mixins import (AnonymousCacheMixin, CachedListRetrieveViewSet,
+                     KeysetPaginationMixin)
+from .negotiation import IgnoreFormatContentNegotiation
+from .pagination import (CustomPagination, FollowKeysetPagination,
+                         KeysetPagination)
+from .search import search_recipes
 from .serializers import (FollowerRecipeSerializer, FollowSerializer,
                           IngredientSerializer, RecipeReadOnlySerializer,
-                          RecipeSerializer, SubscriptionsSerializer,
-                          TagSerializer, UserSerializer)
+                          RecipeSerializer, ShoppingListExportSerializer,
+                          SubscriptionsSerializer, TagSerializer,
+                          UserSerializer, recipes_limit)
+from .shopping_cart import (STREAM_FORMATS, deferred_cart_totals,
+                            export_shopping_list, recipe_ingredients_changed,
+                            shopping_list, shopping_list_rows)
+from .tasks import run_in_background
 
 User = get_user_model()
 
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-pub_date', '-id'),
+}
+
+
+def subscribed_annotation(user, author_field):
+    """Exists-подзапрос: подписан ли user на автора из author_field."""
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Follow.objects.filter(
+        user=user, author=OuterRef(author_field)))
+
+
+def author_recipes(author_ids, limit):
+    """
+    Рецепты авторов одним запросом; при limit - не больше limit
+    последних рецептов каждого автора.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit is not None:
+        recipes = recipes.first_by_author(limit)
+    return recipes
+
+
+def attach_author_recipes(follows, limit):
+    """Рецепты авторов страницы подписок одним запросом."""
+    if not follows:
+        return
+    recipes = author_recipes(
+        {follow.author_id for follow in follows}, limit)
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+    for follow in follows:
+        follow.author_recipes = by_author[follow.author_id]
 
-class CustomUserViewSet(UserViewSet):
+
+class CustomUserViewSet(KeysetPaginationMixin, UserViewSet):
     """Представление для эндпоинта users."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
+    keyset_pagination_classes = {'subscriptions': FollowKeysetPagination}
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        """
+        Подписки текущего пользователя с числом рецептов авторов или
+        пользователи с признаком подписки на них.
+        """
+        if self.action == 'subscriptions':
+            return self.request.user.follower.select_related(
+                'author').annotate(
+                recipes_count=Count('author__recipes')
+            ).order_by('id')
+        return super().get_queryset().annotate(
+            is_subscribed=subscribed_annotation(self.request.user, 'pk')
+        )
+
+    def perform_destroy(self, instance):
+        """
+        Каскад удаляет корзины и избранное пакетно, итоги корзин
+        и счетчики избранного пересчитываем разом.
+        """
+        favorites = FavoritesRecipe.objects.filter(user=instance)
+        with favorites_count_refreshed(favorites), deferred_cart_totals():
+            super().perform_destroy(instance)
+
     @action(methods=['get'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         """Выводим все подписки."""
-        queryset = self.request.user.follower.all()
-        if not queryset.exists():
+        page = self.paginate_queryset(self.get_queryset())
+        if not page and not request.query_params.get(
+                KeysetPagination.cursor_query_param):
             return Response('Вы еще ни на кого не подписаны',
                             status=status.HTTP_400_BAD_REQUEST)
-
-        page = self.paginate_queryset(queryset)
-        if page:
-            serializer = SubscriptionsSerializer(
-                page,
-                many=True,
-                context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
-
-        serializer = SubscriptionsSerializer(queryset, many=True,
-                                             context={'request': request})
-        return Response(serializer.data)
+        attach_author_recipes(page, recipes_limit(request))
+        serializer = SubscriptionsSerializer(
+            page,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
@@ -82,74 +154,126 @@ class CustomUserViewSet(UserViewSet):
                         status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(CachedListRetrieveViewSet):
     """Представление для эндпоинта Tag."""
     queryset = Tag.objects.all()
+    cache_version_name = 'tags'
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(CachedListRetrieveViewSet):
     """Представление для эндпоинта Ingredient."""
     queryset = Ingredient.objects.all()
+    cache_version_name = 'ingredients'
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('name',)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по названию отдаем из индекса в памяти, без запроса к БД,
+        а полный каталог - из кеша ответов.
+        """
+        query = request.query_params.get('name')
+        if query:
+            return Response(ingredient_index.search(query))
+        return super().list(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, KeysetPaginationMixin,
+                    viewsets.ModelViewSet):
     """Представление для работы с рецептами."""
     queryset = Recipe.objects.all()
+    anonymous_cache_versions = ('recipes', 'tags', 'ingredients')
+    anonymous_live_fields = ('favorites_count',)
     pagination_class = CustomPagination
+    keyset_pagination_classes = {'list': KeysetPagination}
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('tags', 'author',)
     filterset_class = RecipeFilter
 
+    def list(self, request, *args, **kwargs):
+        """
+        Выдача поиска упорядочена по релевантности, а keyset-курсор
+        листает по дате публикации, поэтому вместе их не принимаем.
+        """
+        if (request.query_params.get('search')
+                and KeysetPagination.cursor_query_param
+                in request.query_params):
+            return Response(
+                {'errors': 'Поиск нельзя листать курсором, используйте page.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Переопределяем сохранение автора рецепта."""
         return serializer.save(author=self.request.user)
 
+    def perform_update(self, serializer):
+        """При смене ингредиентов пересчитываем итоги корзин с рецептом."""
+        with deferred_cart_totals():
+            recipe = serializer.save()
+            if 'recipe_ingredients' in serializer.validated_data:
+                recipe_ingredients_changed([recipe.pk])
+
+    def perform_destroy(self, instance):
+        """Каскад удаляет корзины пакетно, итоги пересчитываем разом."""
+        with deferred_cart_totals():
+            instance.delete()
+
     def get_serializer_class(self):
         """Определяем сериализаторы в зависимости от реквест методов."""
         if self.action == 'create' or self.action == 'partial_update':
             return RecipeSerializer
         return RecipeReadOnlySerializer
 
-    def get_queryset(self):
-        """Фильтруем выборку рецептов, в зависимости от Query Params."""
+    def get_ordering(self):
+        """
+        Сортировка из ?ordering= (popular - по числу добавлений
+        в избранное) или None для сортировки по умолчанию.
+        """
+        return RECIPE_ORDERINGS.get(self.request.query_params.get('ordering'))
 
+    def get_queryset(self):
+        """
+        Фильтруем выборку рецептов, в зависимости от Query Params.
+        Связанные данные подгружаем заранее, а признаки избранного,
+        корзины и подписки на автора считаем подзапросами, чтобы
+        число запросов не зависело от размера страницы. С ?search=
+        выдача ограничивается найденными рецептами по релевантности,
+        явная ?ordering= важнее релевантности.
+        """
+        queryset = Recipe.objects.with_related().with_user_flags(
+            self.request.user).defer('search_document')
         if self.request.query_params.get('is_favorited') == '1':
-            user = self.request.user
-            favorites = FavoritesRecipe.objects.filter(
-                user=user
-            ).values_list('recipe__id', flat=True)
-            queryset = Recipe.objects.filter(id__in=favorites)
-            return queryset
+            queryset = queryset.filter(is_favorited=True)
         if self.request.query_params.get('is_in_shopping_cart') == '1':
-            user = self.request.user
-            in_cart = ShopList.objects.filter(
-                user=user
-            ).values_list('recipe__id', flat=True)
-            queryset = Recipe.objects.filter(id__in=in_cart)
-            return queryset
-        return Recipe.objects.all()
+            queryset = queryset.filter(is_in_shopping_cart=True)
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_recipes(queryset, search)
+        ordering = self.get_ordering()
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
 
     @action(detail=True, methods=['post'],
             permission_classes=[IsAuthenticated])
     def favorite(self, request, **kwargs):
-        """Добавляем рецепт в избранное."""
+        """Добавляем рецепт в избранное и увеличиваем его счетчик."""
         recipe = get_object_or_404(Recipe, id=self.kwargs["pk"])
         user = self.request.user
-        favorite, created = FavoritesRecipe.objects.get_or_create(
-
-            user=user,
-            recipe=recipe
-        )
-        if not created:
+        try:
+            with transaction.atomic():
+                FavoritesRecipe.objects.create(user=user, recipe=recipe)
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    favorites_count=F('favorites_count') + 1)
+        except IntegrityError:
             return Response('Данный рецепт уже в избранном!',
                             status=status.HTTP_400_BAD_REQUEST
                             )
@@ -158,11 +282,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @favorite.mapping.delete
     def delete_favorite(self, request, **kwargs):
-        """Удаляем рецепт из избранного."""
+        """Удаляем рецепт из избранного и уменьшаем его счетчик."""
         recipe = get_object_or_404(Recipe, id=self.kwargs["pk"])
-        favorite = FavoritesRecipe.objects.filter(
-            user=self.request.user, recipe=recipe).delete()
-        if not favorite:
+        with transaction.atomic():
+            deleted, _ = FavoritesRecipe.objects.filter(
+                user=self.request.user, recipe=recipe).delete()
+            if deleted:
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    favorites_count=F('favorites_count') - deleted)
+        if not deleted:
             return Response({'errors': 'У вас нет такого рецепта!'},
                             status=status.HTTP_400_BAD_REQUEST)
         return Response('Рецепт удален из избранного!',
@@ -201,25 +329,91 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response('Рецепт удален из списка покупок!',
                         status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            content_negotiation_class=IgnoreFormatContentNegotiation)
     def download_shopping_cart(self, request):
         """
-        Формируем список продуктов для покупки и
-        возвращаем его в виде pdf-файла.
+        Формируем список продуктов для покупки и возвращаем его в виде
+        pdf-файла или, по ?format=txt|csv|json, потоком прямо из запроса
+        к БД, без промежуточного буфера.
         """
-        user = self.request.user
-        recipe_id = user.user_shop_lists.filter(user=user).values_list(
-            'recipe_id', flat=True)
-        ingredients = IngredientAmount.objects.values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(count=Sum('amount')).filter(recipes__id__in=recipe_id)
-        shopping_list = []
-        for ingredient in ingredients:
-            shopping_list.append(
-                f"{ingredient['ingredient__name']} -- "
-                f"{ingredient['count']} "
-                f"{ingredient['ingredient__measurement_unit']}")
-
-        buffer = download_pdf(shopping_list)
-        return FileResponse(buffer, as_attachment=True, filename='BuyList.pdf')
+        file_format = request.query_params.get('format', 'pdf')
+        if file_format == 'pdf':
+            buffer = download_pdf(shopping_list(self.request.user))
+            return FileResponse(buffer, as_attachment=True,
+                                filename='BuyList.pdf')
+        if file_format not in STREAM_FORMATS:
+            return Response({'errors': 'Неизвестный формат списка покупок!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        stream, content_type = STREAM_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            stream(shopping_list_rows(self.request.user)),
+            content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="BuyList.{file_format}"')
+        return response
+
+    @download_shopping_cart.mapping.post
+    def export_shopping_cart(self, request):
+        """
+        Ставим формирование pdf-файла в фоновую очередь для больших
+        корзин. Статус и ссылку на файл отдает эндпоинт выгрузок.
+        """
+        ShoppingListExport.objects.filter(
+            user=request.user).expired().delete()
+        export = ShoppingListExport.objects.create(user=request.user)
+        run_in_background(export_shopping_list, export.id)
+        export.refresh_from_db(fields=('status', 'error', 'finished'))
+        serializer = ShoppingListExportSerializer(
+            export, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, permission_classes=[IsAdminUser],
+            url_path='export',
+            content_negotiation_class=IgnoreFormatContentNegotiation)
+    def bulk_export(self, request):
+        """
+        Все рецепты с авторами, тегами и ингредиентами потоком NDJSON,
+        по одному рецепту в строке, для переноса между окружениями.
+        """
+        response = StreamingHttpResponse(export_recipes(),
+                                         content_type=CONTENT_TYPE)
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser],
+            url_path='import')
+    def bulk_import(self, request):
+        """
+        Загружаем NDJSON-выгрузку из тела запроса: строки читаются
+        из потока и сохраняются пачками, каждая в своей транзакции.
+        """
+        report = RecipeImporter().run(request.stream or ())
+        return Response(report)
+
+
+class ShoppingListExportViewSet(mixins.RetrieveModelMixin,
+                                viewsets.GenericViewSet):
+    """Статус фоновой выгрузки списка покупок и готовый файл."""
+    serializer_class = ShoppingListExportSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ShoppingListExport.objects.active().filter(
+            user=self.request.user).defer('content')
+
+    @action(detail=True)
+    def download(self, request, **kwargs):
+        """Отдаем готовый pdf-файл."""
+        export = get_object_or_404(
+            ShoppingListExport.objects.active(), user=request.user,
+            id=self.kwargs['pk'])
+        if export.status != ShoppingListExport.DONE:
+            return Response({'errors': 'Файл еще не готов!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        response = HttpResponse(bytes(export.content),
+                                content_type='application/pdf')
+        response['Content-Disposition'] = (
+            'attachment; filename="BuyList.pdf"')
+        return response
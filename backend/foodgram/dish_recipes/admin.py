@@ -1,7 +1,25 @@
 from django.contrib import admin
+from django.db.models import Prefetch
 
-from .models import (FavoritesRecipe, Follow, Ingredient, IngredientAmount,
-                     Recipe, RecipeTag, ShopList, Tag)
+from api.images import delete_image_variants, generate_image_variants
+from api.search import refresh_search_documents
+from api.shopping_cart import deferred_cart_totals
+from api.tasks import run_in_background
+
+from .models import (FavoritesRecipe, Follow, Ingredient, Recipe,
+                     RecipeIngredient, RecipeTag, ShopList, Tag)
+from .paginator import EstimatedCountPaginator
+from .utils import favorites_count_refreshed
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """
+    Список большой таблицы: число строк без фильтров оценивается по
+    статистике PostgreSQL, полный COUNT(*) рядом с отфильтрованным
+    результатом не выполняется.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -13,26 +31,81 @@ class TagAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class DeferredCartTotalsMixin:
+    """
+    Удаления каскадом задевают строки ингредиентов рецептов: итоги
+    затронутых корзин пересчитываем один раз в конце.
+    """
+
+    def delete_model(self, request, obj):
+        with deferred_cart_totals():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with deferred_cart_totals():
+            super().delete_queryset(request, queryset)
+
+
+class IngredientAdmin(DeferredCartTotalsMixin, EstimatedCountAdmin):
     """Администрирование ингредиентов."""
-    list_display = ('name',)
-    list_filter = ('name',)
+    list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
     empty_value_display = '-пусто-'
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeIngredientInline(admin.TabularInline):
+    """Ингредиенты рецепта с количеством."""
+    model = RecipeIngredient
+    extra = 1
+    autocomplete_fields = ('ingredient',)
+
+
+class RecipeAdmin(DeferredCartTotalsMixin, EstimatedCountAdmin):
     """Администрирование рецептов."""
+    inlines = (RecipeIngredientInline,)
     list_display = ('id', 'author', 'name',
                     'show_tags', 'show_ingredients', 'favorited_count')
-    list_filter = ('author', 'name', 'tag')
-    search_fields = ('name', 'author__username', 'tag__name')
+    list_filter = ('tag',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author',)
     ordering = ('name',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        """Теги и ингредиенты для колонок списка подгружаем заранее."""
+        return super().get_queryset(request).defer(
+            'search_document'
+        ).prefetch_related(
+            'tag',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
+
+    def save_model(self, request, obj, form, change):
+        image_changed = 'image' in form.changed_data
+        old_image = None
+        if image_changed:
+            obj.image_variants = False
+            if change:
+                old_image = Recipe.objects.filter(pk=obj.pk).values_list(
+                    'image', flat=True).first()
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            run_in_background(delete_image_variants, old_image)
+            run_in_background(generate_image_variants, obj.pk)
+
+    def save_related(self, request, form, formsets, change):
+        """Строки ингредиентов из инлайна: итоги корзин пересчитываем разом."""
+        with deferred_cart_totals():
+            super().save_related(request, form, formsets, change)
+        refresh_search_documents([form.instance.pk])
+
     def show_ingredients(self, obj):
         return '\n'.join(
-            [item.ingredient.name for item in obj.ingredient.all()]
+            [item.ingredient.name
+             for item in obj.recipe_ingredients.all()]
         )
 
     show_ingredients.short_description = 'Ингредиенты рецепта'
@@ -43,42 +116,67 @@ class RecipeAdmin(admin.ModelAdmin):
     show_tags.short_description = 'Тэги рецепта'
 
     def favorited_count(self, obj):
-        favorited_count = FavoritesRecipe.objects.filter(recipe=obj).count()
-        return favorited_count
+        return obj.favorites_count
 
     favorited_count.short_description = 'В избранном'
+    favorited_count.admin_order_field = 'favorites_count'
 
 
-class IngredientAmountAdmin(admin.ModelAdmin):
-    """Администрирование количества ингредиентов."""
-    list_display = ('ingredient', 'amount')
+class RecipeIngredientAdmin(DeferredCartTotalsMixin, EstimatedCountAdmin):
+    """Администрирование количества ингредиентов в рецептах."""
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
 
 
-class RecipeTagAdmin(admin.ModelAdmin):
+class RecipeTagAdmin(EstimatedCountAdmin):
     """Администрирование тегов ы рецептах."""
     list_display = ('recipe', 'tag')
+    list_select_related = ('recipe', 'tag')
+    autocomplete_fields = ('recipe', 'tag')
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(EstimatedCountAdmin):
     """Администрирование подписки."""
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
 
 
-class FavoritesRecipeAdmin(admin.ModelAdmin):
+class FavoritesRecipeAdmin(EstimatedCountAdmin):
     """Администрирование избранного."""
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+
+    def save_model(self, request, obj, form, change):
+        previous = form.initial.get('recipe')
+        super().save_model(request, obj, form, change)
+        Recipe.objects.filter(
+            pk__in=(obj.recipe_id, previous)).refresh_favorites_count()
+
+    def delete_model(self, request, obj):
+        favorites = FavoritesRecipe.objects.filter(pk=obj.pk)
+        with favorites_count_refreshed(favorites):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with favorites_count_refreshed(queryset):
+            super().delete_queryset(request, queryset)
 
 
-class ShopListAdmin(admin.ModelAdmin):
+class ShopListAdmin(EstimatedCountAdmin):
     """Администрирование списка покупок."""
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 admin.site.register(Tag, TagAdmin)
 admin.site.register(RecipeTag, RecipeTagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
-admin.site.register(IngredientAmount, IngredientAmountAdmin)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(FavoritesRecipe, FavoritesRecipeAdmin)
 admin.site.register(ShopList, ShopListAdmin)
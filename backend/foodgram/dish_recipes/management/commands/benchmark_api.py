@@ -0,0 +1,114 @@
+import json
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from dish_recipes.models import Recipe, Tag
+from users.models import CustomUser
+
+from .generate_data import USERNAME_PREFIX
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def benchmark_host():
+    """Хост из ALLOWED_HOSTS, который пропустит тестовый клиент."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'testserver'
+
+
+class Command(BaseCommand):
+    help = ('Замер задержек основных эндпоинтов API на сгенерированных '
+            'данных. Результат выводится в формате JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Число замеров на эндпоинт.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', type=str,
+                            help='Файл для результата вместо stdout.')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть больше 0.')
+        user = CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('pk').first()
+        recipe = Recipe.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        if user is None or recipe is None or tag is None:
+            raise CommandError('Сначала выполните generate_data.')
+        token, _ = Token.objects.get_or_create(user=user)
+
+        anonymous = Client(SERVER_NAME=benchmark_host())
+        authorized = Client(SERVER_NAME=benchmark_host(),
+                            HTTP_AUTHORIZATION=f'Token {token.key}')
+        endpoints = (
+            ('recipes-list', anonymous, '/api/recipes/'),
+            ('recipes-list-auth', authorized, '/api/recipes/'),
+            ('recipes-list-tags', authorized,
+             f'/api/recipes/?tags={tag.slug}'),
+            ('recipes-list-favorited', authorized,
+             '/api/recipes/?is_favorited=1'),
+            ('recipes-detail', authorized, f'/api/recipes/{recipe.pk}/'),
+            ('recipes-download-shopping-cart', authorized,
+             '/api/recipes/download_shopping_cart/'),
+            ('users-list', authorized, '/api/users/'),
+            ('users-detail', authorized, f'/api/users/{user.pk}/'),
+            ('users-me', authorized, '/api/users/me/'),
+            ('users-subscriptions', authorized,
+             '/api/users/subscriptions/?recipes_limit=3'),
+        )
+        report = {
+            'requests': options['requests'],
+            'dataset': {
+                'users': CustomUser.objects.count(),
+                'recipes': Recipe.objects.count(),
+            },
+            'endpoints': {
+                name: self.measure(client, url, options)
+                for name, client, url in endpoints
+            },
+        }
+        result = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(result)
+        else:
+            self.stdout.write(result)
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings = []
+        statuses = Counter()
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            request_started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - request_started) * 1000)
+            statuses[response.status_code] += 1
+        elapsed = time.perf_counter() - started
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'rps': round(len(timings) / elapsed, 2) if elapsed else None,
+            'status_codes': {
+                str(code): count for code, count in statuses.items()},
+        }
@@ -0,0 +1,103 @@
+import datetime
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from api.images import VARIANTS_DIR, variant_names
+from dish_recipes.models import (Recipe, ShopList, ShoppingCartTotal,
+                                 ShoppingListExport)
+
+BATCH_SIZE = 500
+FILE_GRACE_PERIOD = datetime.timedelta(hours=1)
+
+
+def delete_in_batches(queryset, batch_size):
+    """
+    Удаляем строки пачками по pk, каждую в своей короткой транзакции,
+    чтобы не держать долгих блокировок на больших таблицах.
+    """
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+class Command(BaseCommand):
+    help = ('Удаление осиротевших данных: просроченных выгрузок списка '
+            'покупок, итогов корзин без рецептов в корзине и, с --images, '
+            'файлов изображений, на которые не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--exports-days', type=int,
+                            help='Хранить выгрузки столько дней '
+                                 '(по умолчанию SHOPPING_LIST_EXPORT_TTL).')
+        parser.add_argument('--images', action='store_true',
+                            help='Удалить файлы изображений без рецептов.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не удалять.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        exports = ShoppingListExport.objects.expired()
+        if options['exports_days'] is not None:
+            exports = ShoppingListExport.objects.filter(
+                created__lt=timezone.now() - datetime.timedelta(
+                    days=options['exports_days']))
+        exports = self.clean(exports)
+        totals = self.clean(self.stale_totals())
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        report = f'{verb} выгрузок: {exports}, итогов корзин: {totals}'
+        if options['images']:
+            files, size = self.clean_images()
+            report += f', файлов: {files} ({size / 1024:.1f} КБ)'
+        self.stdout.write(self.style.SUCCESS(report + '.'))
+
+    def clean(self, queryset):
+        if self.dry_run:
+            return queryset.count()
+        return delete_in_batches(queryset, self.batch_size)
+
+    @staticmethod
+    def stale_totals():
+        """Итоги по ингредиентам, которых нет ни в одном рецепте корзины."""
+        return ShoppingCartTotal.objects.annotate(
+            in_cart=Exists(ShopList.objects.filter(
+                user=OuterRef('user'),
+                recipe__recipe_ingredients__ingredient=OuterRef(
+                    'ingredient')))
+        ).filter(in_cart=False)
+
+    def clean_images(self):
+        """
+        Изображения рецептов и их варианты без ссылок из базы. Свежие
+        файлы не трогаем: рецепт с ними может быть еще не сохранен.
+        """
+        directory = Recipe._meta.get_field('image').upload_to.rstrip('/')
+        used = set()
+        for image in Recipe.objects.values_list('image', flat=True).iterator():
+            used.add(image)
+            used.update(variant_names(image))
+        threshold = timezone.now() - FILE_GRACE_PERIOD
+        files, size = 0, 0
+        for folder in (directory, f'{directory}/{VARIANTS_DIR}'):
+            if not default_storage.exists(folder):
+                continue
+            for name in default_storage.listdir(folder)[1]:
+                path = f'{folder}/{name}'
+                if (path in used or default_storage.get_modified_time(
+                        path) > threshold):
+                    continue
+                files += 1
+                size += default_storage.size(path)
+                if not self.dry_run:
+                    default_storage.delete(path)
+        return files, size
@@ -0,0 +1,164 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.query import RawQuerySet
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.pagination import KeysetPagination
+from api.serializers import recipes_limit
+from api.shopping_cart import shopping_list_rows
+from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
+                       TagViewSet, author_recipes)
+from dish_recipes.models import FavoritesRecipe, Recipe, ShopList, Tag
+from users.models import CustomUser
+
+SEQ_SCAN = re.compile(
+    r'Seq Scan on "?(?P<pg>\w+)"?|\bSCAN (?:TABLE )?(?P<sqlite>\w+)\b'
+    r'(?! USING)')
+
+
+def make_view(viewset, action, user, params=None, **kwargs):
+    """
+    Представление API в том состоянии, в каком оно обрабатывает GET
+    с параметрами params от user: выборки строят его же get_queryset,
+    filter_queryset и пагинатор.
+    """
+    request = APIRequestFactory().get('/', params or {})
+    force_authenticate(request, user)
+    view = viewset()
+    view.action_map = {'get': action}
+    view.args, view.kwargs = (), kwargs
+    view.format_kwarg = None
+    view.request = view.initialize_request(request)
+    view.headers = {}
+    return view
+
+
+def page(view):
+    """Выборка первой страницы так, как ее запрашивает пагинатор."""
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    if isinstance(paginator, KeysetPagination):
+        return paginator.get_page_queryset(queryset, view.request, view)
+    return queryset[:paginator.get_page_size(view.request)]
+
+
+def recipe_pages(user, recipe, tag):
+    cursor = KeysetPagination.cursor_for(recipe, KeysetPagination.ordering)
+    cases = (
+        ('лента', {}),
+        ('лента, keyset', {'cursor': cursor}),
+        ('популярные', {'ordering': 'popular'}),
+        ('автор', {'author': recipe.author_id}),
+        ('тег', {'tags': tag.slug}),
+        ('избранное', {'is_favorited': '1'}),
+        ('корзина', {'is_in_shopping_cart': '1'}),
+        ('поиск', {'search': recipe.name.split()[0]}),
+    )
+    for name, params in cases:
+        yield f'recipes: {name}', page(
+            make_view(RecipeViewSet, 'list', user, params))
+    view = make_view(RecipeViewSet, 'retrieve', user, pk=recipe.pk)
+    yield 'recipes: рецепт', view.filter_queryset(
+        view.get_queryset()).filter(pk=recipe.pk)
+
+
+def endpoint_querysets(user, recipe, tag):
+    """
+    Выборки эндпоинтов API, по одной на случай. Списки строятся самими
+    представлениями; запросы действий записи - те же, что в действиях.
+    """
+    yield from recipe_pages(user, recipe, tag)
+    yield 'recipes: повтор названия', Recipe.objects.filter(
+        author_id=recipe.author_id, name=recipe.name)
+    yield 'recipes: в избранном', FavoritesRecipe.objects.filter(
+        user=user, recipe=recipe)
+    yield 'recipes: в корзинах', ShopList.objects.filter(
+        user=user, recipe=recipe)
+    yield 'recipes: список покупок', shopping_list_rows(user)
+    yield 'users: список', page(make_view(CustomUserViewSet, 'list', user))
+    view = make_view(CustomUserViewSet, 'subscriptions', user,
+                     {'recipes_limit': 3})
+    subscriptions = page(view)
+    yield 'users: подписки', subscriptions
+    yield 'users: рецепты авторов', author_recipes(
+        {follow.author_id for follow in subscriptions},
+        recipes_limit(view.request))
+    for name, viewset in (('ingredients', IngredientViewSet),
+                          ('tags', TagViewSet)):
+        view = make_view(viewset, 'list', user)
+        yield name, view.filter_queryset(view.get_queryset())
+
+
+def explain(queryset):
+    """EXPLAIN выборки; у raw-запросов (оконные функции) - вручную."""
+    if not isinstance(queryset, RawQuerySet):
+        return queryset.explain()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {queryset.raw_query}',
+            queryset.params)
+        return '\n'.join(' '.join(map(str, row)) for row in cursor)
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN запросов эндпоинтов API на текущей базе: отмечает '
+            'последовательные сканирования больших таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Таблицы меньше этого размера не отмечать.')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить планы целиком.')
+        parser.add_argument('--fail', action='store_true',
+                            help='Завершиться ошибкой при найденных '
+                                 'сканированиях (для CI).')
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('pk').first()
+        tag = Tag.objects.order_by('pk').first()
+        if recipe is None or tag is None:
+            raise CommandError('Нужны хотя бы один рецепт и один тег.')
+        user = (CustomUser.objects.filter(pk__in=ShopList.objects.values(
+            'user')).order_by('pk').first() or recipe.author)
+        self.sizes = {}
+        flagged = 0
+        for name, queryset in endpoint_querysets(user, recipe, tag):
+            plan = explain(queryset)
+            scans = self.large_scans(plan, options['min_rows'])
+            flagged += bool(scans)
+            if scans:
+                self.stdout.write(self.style.WARNING(
+                    f'{name}: полное сканирование '
+                    + ', '.join(f'{table} ({rows})'
+                                for table, rows in scans)))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if options['verbose_plans']:
+                self.stdout.write(plan + '\n')
+        if flagged and options['fail']:
+            raise CommandError(
+                f'Полные сканирования больших таблиц: {flagged}.')
+
+    def large_scans(self, plan, min_rows):
+        scans = []
+        for match in SEQ_SCAN.finditer(plan):
+            table = match.group('pg') or match.group('sqlite')
+            rows = self.table_size(table)
+            if rows is not None and rows >= min_rows:
+                scans.append((table, rows))
+        return scans
+
+    def table_size(self, table):
+        """Размер таблицы; для алиасов соединений вернется None."""
+        if table not in self.sizes:
+            size = None
+            if table in connection.introspection.table_names():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'SELECT COUNT(*) FROM '
+                        f'{connection.ops.quote_name(table)}')
+                    size = cursor.fetchone()[0]
+            self.sizes[table] = size
+        return self.sizes[table]
@@ -0,0 +1,150 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.caching import bump_version
+from api.search import refresh_search_documents
+from api.shopping_cart import deferred_cart_totals, rebuild_cart_totals
+from dish_recipes.models import (FavoritesRecipe, Follow, Ingredient,
+                                 Recipe, RecipeIngredient, RecipeTag,
+                                 ShopList, Tag)
+from dish_recipes.utils import BATCH_SIZE, bulk_create_with_pk
+from users.models import CustomUser
+
+USERNAME_PREFIX = 'bench_user_'
+PASSWORD = 'bench-password'
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F2C94C'),
+    ('Перекус', 'snack', '#56CCF2'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Генерация воспроизводимого набора данных для нагрузочного '
+            'тестирования.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=10,
+                            help='Рецептов на одного автора.')
+        parser.add_argument('--ingredients', type=int, default=8,
+                            help='Ингредиентов в одном рецепте.')
+        parser.add_argument('--follows', type=int, default=5,
+                            help='Подписок у одного пользователя.')
+        parser.add_argument('--favorites', type=int, default=10,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true',
+                            help='Удалить ранее сгенерированные данные.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if not options['flush'] and CustomUser.objects.filter(
+                username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError(
+                'Сгенерированные данные уже есть в базе; чтобы создать '
+                'их заново, запустите команду с --flush.')
+        with transaction.atomic():
+            if options['flush']:
+                with deferred_cart_totals():
+                    CustomUser.objects.filter(
+                        username__startswith=USERNAME_PREFIX).delete()
+            tags = self.create_tags()
+            ingredients = self.create_ingredients()
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(
+                rng, users, tags, ingredients,
+                options['recipes'], options['ingredients'])
+            self.create_relations(rng, users, recipes, options)
+        bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, '
+            f'рецептов: {len(recipes)}.'))
+
+    def create_tags(self):
+        for name, slug, color in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return list(Tag.objects.order_by('pk'))
+
+    def create_ingredients(self):
+        """Берем загруженный каталог, а при его отсутствии создаем свой."""
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'продукт {index:04}', measurement_unit='г')
+                for index in range(200)
+            )
+            bump_version('ingredients')
+        return list(Ingredient.objects.order_by('pk'))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        return bulk_create_with_pk(CustomUser, [
+            CustomUser(
+                username=f'{USERNAME_PREFIX}{index}',
+                email=f'{USERNAME_PREFIX}{index}@foodgram.bench',
+                first_name='Пользователь',
+                last_name=str(index),
+                password=password,
+            )
+            for index in range(count)
+        ])
+
+    def create_recipes(self, rng, users, tags, ingredients,
+                       per_author, ingredients_count):
+        recipes = bulk_create_with_pk(Recipe, [
+            Recipe(
+                author=user,
+                name=f'Рецепт {user.username} №{index}',
+                text=f'Описание рецепта №{index}',
+                image='recipes/bench.png',
+                cooking_time=rng.randint(5, 180),
+            )
+            for user in users
+            for index in range(per_author)
+        ])
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rng.sample(tags, min(2, len(tags)))
+        ], batch_size=BATCH_SIZE)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rng.sample(
+                ingredients, min(ingredients_count, len(ingredients)))
+        ], batch_size=BATCH_SIZE)
+        for start in range(0, len(recipes), 500):
+            refresh_search_documents(
+                [recipe.pk for recipe in recipes[start:start + 500]])
+        return recipes
+
+    def create_relations(self, rng, users, recipes, options):
+        follows, favorites, carts = [], [], []
+        for user in users:
+            authors = [author for author in users if author != user]
+            for author in rng.sample(
+                    authors, min(options['follows'], len(authors))):
+                follows.append(Follow(user=user, author=author))
+            for recipe in rng.sample(
+                    recipes, min(options['favorites'], len(recipes))):
+                favorites.append(FavoritesRecipe(user=user, recipe=recipe))
+            for recipe in rng.sample(
+                    recipes, min(options['cart'], len(recipes))):
+                carts.append(ShopList(user=user, recipe=recipe))
+        Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE)
+        FavoritesRecipe.objects.bulk_create(favorites, batch_size=BATCH_SIZE)
+        ShopList.objects.bulk_create(carts, batch_size=BATCH_SIZE)
+        for start in range(0, len(recipes), 500):
+            Recipe.objects.filter(pk__in=[
+                recipe.pk for recipe in recipes[start:start + 500]
+            ]).refresh_favorites_count()
+        rebuild_cart_totals(user.pk for user in users)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from api.caching import bump_version
+from api.images import generate_image_variants
+from dish_recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Миниатюры и WebP-варианты для изображений рецептов, '
+            'у которых их еще нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать варианты для всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.filter(image_variants=False)
+        done, failed = 0, 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            try:
+                done += generate_image_variants(recipe_id, bump=False)
+            except (OSError, ValueError,
+                    Image.DecompressionBombError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        if done:
+            bump_version('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово изображений: {done}, с ошибками: {failed}.'))
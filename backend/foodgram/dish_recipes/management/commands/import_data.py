@@ -1,18 +1,71 @@
-from django.core.management.base import BaseCommand
+import os
+import time
+from collections import Counter
 
-from .parsers.model_parsers import ingredient_parser
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.caching import bump_version
+from dish_recipes.utils import chunked
+
+from .parsers.model_parsers import ingredient_parser, tag_parser
+from .parsers.readers import READERS
 
 
 class Command(BaseCommand):
-    help = 'Импорт данных в БД из csv файлов.'
+    help = ('Импорт данных в БД из csv и json файлов. Файл читается '
+            'потоком и загружается пачками; уже загруженные строки '
+            'обновляются, а не дублируются.')
 
     HANDLERS = {
-        'ingredient': ingredient_parser
+        'ingredient': ingredient_parser,
+        'tag': tag_parser,
     }
 
     def add_arguments(self, parser):
-        parser.add_argument('--model', nargs='?', type=str, action='store')
-        parser.add_argument('--file', nargs='?', type=str, action='store')
+        parser.add_argument('--model', nargs='?', type=str, action='store',
+                            choices=sorted(self.HANDLERS),
+                            default='ingredient')
+        parser.add_argument('--file', nargs='?', type=str, action='store',
+                            default='data/ingredients.json')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать изменения, не сохранять.')
 
     def handle(self, *args, **options):
-        Command.HANDLERS[options['model']](options['file'])
+        importer = self.HANDLERS[options['model']]
+        path = os.path.join(settings.BASE_DIR, options['file'])
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError(
+                f'Поддерживаются файлы: {", ".join(sorted(READERS))}.')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0.')
+        totals = Counter()
+        processed, started = 0, time.monotonic()
+        for batch in chunked(reader(path, importer.fields),
+                             options['batch_size']):
+            counts, conflicts = importer.load(batch, options['dry_run'])
+            totals.update(counts)
+            for conflict in conflicts:
+                self.stderr.write(f'Конфликт: {conflict}')
+            processed += len(batch)
+            self.stdout.write(
+                f'Обработано строк: {processed} '
+                f'({self.rate(processed, started):.0f} строк/с)')
+        if (not options['dry_run'] and importer.cache_version
+                and (totals['created'] or totals['updated'])):
+            bump_version(importer.cache_version)
+        verb = 'Будет' if options['dry_run'] else 'Итого'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: создано {totals["created"]}, '
+            f'обновлено {totals["updated"]}, '
+            f'пропущено {totals["skipped"]}, '
+            f'конфликтов {totals["conflicts"]} за '
+            f'{time.monotonic() - started:.1f} с.'))
+
+    @staticmethod
+    def rate(processed, started):
+        return processed / max(time.monotonic() - started, 1e-6)
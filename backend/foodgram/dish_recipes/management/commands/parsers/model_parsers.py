@@ -1,31 +1,121 @@
-import csv
-import os
-
-from django.conf import settings
-
-from models import Ingredient
-
-
-def csv_parser(file):
-    """Функционал для csv."""
-    file_path = os.path.join(settings.BASE_DIR, file)
-    result = []
-    with open(file_path, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader)
-        for row in reader:
-            result.append(row)
-    return result
-
-
-def ingredient_parser(file):
-    """Парсер для модели ингредиентов."""
-    rows = csv_parser(file)
-    objs = [
-        Ingredient(
-            name=row[0],
-            measurement_unit=row[1],
-        )
-        for row in rows
-    ]
-    Ingredient.objects.bulk_create(objs)
+from collections import Counter
+
+from django.db import transaction
+
+from dish_recipes.models import Ingredient, Tag
+from dish_recipes.utils import BATCH_SIZE
+
+
+class ModelImporter:
+    """
+    Загрузка пачки строк в модель одним проходом: строки с новым ключом
+    key_fields создаются, у найденных по ключу обновляются value_fields,
+    остальные пропускаются. Повторный импорт того же файла ничего
+    не меняет. Строки, чьи значения unique_fields уже заняты другим
+    объектом, не загружаются и попадают в отчет о конфликтах.
+    """
+
+    def __init__(self, model, key_fields, value_fields=(), unique_fields=(),
+                 cache_version=None):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.value_fields = tuple(value_fields)
+        self.unique_fields = tuple(unique_fields)
+        self.cache_version = cache_version
+
+    @property
+    def fields(self):
+        return self.key_fields + self.value_fields
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    def existing(self, keys):
+        """Уже загруженные объекты с ключами из keys."""
+        first = self.key_fields[0]
+        objs = self.model.objects.filter(
+            **{f'{first}__in': {key[0] for key in keys}})
+        result = {}
+        for obj in objs:
+            key = tuple(getattr(obj, field) for field in self.key_fields)
+            if key in keys:
+                result[key] = obj
+        return result
+
+    def owners(self, rows):
+        """
+        Для каждого поля из unique_fields - ключи объектов, которым уже
+        принадлежат значения из rows: по запросу на поле.
+        """
+        owners = {}
+        for field in self.unique_fields:
+            found = self.model.objects.filter(**{
+                f'{field}__in': {row[field] for row in rows}
+            }).values_list(field, *self.key_fields)
+            owners[field] = {value: tuple(key) for value, *key in found}
+        return owners
+
+    def load(self, rows, dry_run=False):
+        """
+        Загружаем пачку rows; возвращаем счетчики изменений и описания
+        строк с конфликтами.
+        """
+        batch = {self.key(row): row for row in rows}
+        existing = self.existing(batch)
+        owners = self.owners(batch.values())
+        to_create, to_update, conflicts = [], [], []
+        for key, row in batch.items():
+            taken = [field for field in self.unique_fields
+                     if owners[field].get(row[field], key) != key]
+            if taken:
+                conflicts.append(self.describe_conflict(key, row, taken))
+                continue
+            for field in self.unique_fields:
+                owners[field][row[field]] = key
+            obj = existing.get(key)
+            if obj is None:
+                to_create.append(self.model(**row))
+                continue
+            changed = [field for field in self.value_fields
+                       if getattr(obj, field) != row[field]]
+            for field in changed:
+                setattr(obj, field, row[field])
+            if changed:
+                to_update.append(obj)
+        created = len(to_create)
+        if not dry_run:
+            with transaction.atomic():
+                if to_create:
+                    created = self.insert(to_create)
+                if to_update:
+                    self.model.objects.bulk_update(
+                        to_update, self.value_fields, batch_size=BATCH_SIZE)
+        counts = Counter(created=created, updated=len(to_update),
+                         conflicts=len(conflicts))
+        counts['skipped'] = len(rows) - sum(counts.values())
+        return counts, conflicts
+
+    def insert(self, objs):
+        """
+        Создаем объекты, пропуская уже вставленные параллельно, и
+        возвращаем число действительно добавленных: bulk_create с
+        ignore_conflicts его не сообщает, поэтому сверяем ключи до и после.
+        """
+        keys = {self.key(obj.__dict__) for obj in objs}
+        before = len(self.existing(keys))
+        self.model.objects.bulk_create(
+            objs, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        return len(self.existing(keys)) - before
+
+    def describe_conflict(self, key, row, fields):
+        values = ', '.join(f'{field}={row[field]!r}' for field in fields)
+        return (f'{self.model._meta.verbose_name} '
+                f'{", ".join(map(str, key))}: {values} уже заняты '
+                'другой записью.')
+
+
+ingredient_parser = ModelImporter(
+    Ingredient, ('name', 'measurement_unit'), cache_version='ingredients')
+tag_parser = ModelImporter(
+    Tag, ('slug',), ('name', 'color'), unique_fields=('name', 'color'),
+    cache_version='tags')
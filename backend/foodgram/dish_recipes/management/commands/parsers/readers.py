@@ -0,0 +1,79 @@
+import csv
+import json
+
+from django.core.management.base import CommandError
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+
+def pick(item, fields, where):
+    """Значения полей fields из словаря item без лишних пробелов."""
+    if not isinstance(item, dict):
+        raise CommandError(f'{where}: ожидается объект, получено {item!r}.')
+    missing = [field for field in fields if field not in item]
+    if missing:
+        raise CommandError(f'{where}: нет полей {", ".join(missing)}.')
+    return {field: str(item[field]).strip() for field in fields}
+
+
+def read_csv(path, fields):
+    """
+    Строки CSV-файла по одной в виде словарей по fields. Если первая
+    строка - заголовок с именами полей, столбцы берутся в его порядке,
+    иначе в порядке fields.
+    """
+    columns = list(fields)
+    with open(path, newline='', encoding='utf-8') as file:
+        for number, row in enumerate(csv.reader(file), start=1):
+            if number == 1 and sorted(row) == sorted(fields):
+                columns = row
+                continue
+            if not row:
+                continue
+            yield pick(dict(zip(columns, row)), fields, f'Строка {number}')
+
+
+def skip(buffer, position, chars):
+    while position < len(buffer) and buffer[position] in chars:
+        position += 1
+    return position
+
+
+def read_json(path, fields):
+    """
+    Элементы JSON-массива по одному. Файл читается кусками по CHUNK_SIZE,
+    а каждый элемент разбирается JSONDecoder.raw_decode, как только он
+    целиком попал в буфер, поэтому весь файл в памяти не держится.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as file:
+        buffer, position, eof = file.read(CHUNK_SIZE), 0, False
+        position = skip(buffer, position, WHITESPACE)
+        if buffer[position:position + 1] != '[':
+            raise CommandError('Ожидается JSON-массив объектов.')
+        position, number = position + 1, 0
+        while True:
+            position = skip(buffer, position, WHITESPACE + ',')
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = None
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise CommandError(
+                        f'Некорректный JSON после элемента {number}.')
+                chunk = file.read(CHUNK_SIZE)
+                buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+                continue
+            number += 1
+            position = end
+            yield pick(item, fields, f'Элемент {number}')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.shopping_cart import rebuild_cart_totals
+from dish_recipes.models import ShopList
+from users.models import CustomUser
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Пересчет итогов корзин (ShoppingCartTotal) по спискам покупок: '
+            'первичное заполнение и исправление расхождений.')
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            CustomUser.objects.filter(
+                pk__in=ShopList.objects.values('user')
+            ).values_list('pk', flat=True).order_by('pk')
+        )
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            rebuild_cart_totals(user_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны корзины пользователей: {len(user_ids)}.'))
@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bulk import (EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, RecipeImporter,
+                      export_recipes)
+
+
+class Command(BaseCommand):
+    help = ('Выгрузка рецептов в NDJSON и загрузка такой выгрузки '
+            '(тот же формат, что у /api/recipes/export/ и /import/).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('direction', choices=('export', 'import'))
+        parser.add_argument('--file', default='-',
+                            help='Файл выгрузки; "-" - stdout/stdin.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=EXPORT_CHUNK_SIZE)
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['direction'] == 'export':
+            self.export(options['file'], options['chunk_size'])
+        else:
+            self.load(options['file'], options['batch_size'])
+
+    def export(self, path, chunk_size):
+        lines = export_recipes(chunk_size=chunk_size)
+        if path == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        count = 0
+        with open(path, 'w', encoding='utf-8') as file:
+            for line in lines:
+                file.write(line)
+                count += 1
+        self.stderr.write(f'Выгружено рецептов: {count}.')
+
+    def load(self, path, batch_size):
+        importer = RecipeImporter(batch_size=batch_size)
+        if path == '-':
+            report = importer.run(sys.stdin)
+        else:
+            try:
+                with open(path, encoding='utf-8') as file:
+                    report = importer.run(file)
+            except OSError as error:
+                raise CommandError(error)
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано рецептов: {report["created"]}, '
+            f'обновлено: {report["updated"]}, '
+            f'с ошибками: {report["failed"]}.'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+
+from dish_recipes.models import Recipe
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Сверка счетчиков избранного (Recipe.favorites_count) '
+            'с таблицей избранного и исправление расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только найти расхождения, не исправлять.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = drifted = 0
+        last = 0
+        while True:
+            pks = list(Recipe.objects.filter(pk__gt=last).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            batch = Recipe.objects.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            stale = list(batch.annotate(
+                actual=Count('favorite_recipe')
+            ).exclude(favorites_count=F('actual')).values_list(
+                'pk', flat=True))
+            if stale and not options['dry_run']:
+                with transaction.atomic():
+                    Recipe.objects.filter(
+                        pk__in=stale).refresh_favorites_count()
+            checked += len(pks)
+            drifted += len(stale)
+            last = pks[-1]
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено рецептов: {checked}. {verb} расхождений: {drifted}.'))
@@ -0,0 +1,108 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:54
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavoritesRecipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'избранное',
+                'verbose_name_plural': 'избранное',
+            },
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'подписка',
+                'verbose_name_plural': 'подписки',
+            },
+        ),
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='название')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='единица измерения')),
+            ],
+            options={
+                'verbose_name': 'ингредиент',
+                'verbose_name_plural': 'ингредиенты',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientAmount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='количество ингредиента')),
+            ],
+            options={
+                'verbose_name': 'количество ингредиента в рецепте',
+                'verbose_name_plural': 'количество ингредиентов в рецепте',
+            },
+        ),
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Введите название рецепта', max_length=200, verbose_name='название')),
+                ('text', models.TextField(verbose_name='описание рецепта')),
+                ('image', models.ImageField(upload_to='recipes/', verbose_name='изображение')),
+                ('cooking_time', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1, 'Значение не может быть меньше 1')], verbose_name='время приготовления')),
+                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='дата публикации')),
+            ],
+            options={
+                'verbose_name': 'pецепт',
+                'verbose_name_plural': 'pецепты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'pецепт/тэг',
+                'verbose_name_plural': 'pецепты/тэги',
+            },
+        ),
+        migrations.CreateModel(
+            name='ShopList',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'список покупок',
+                'verbose_name_plural': 'списки покупок',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Введите имя тега', max_length=200, unique=True, verbose_name='название')),
+                ('slug', models.SlugField(max_length=200, unique=True, verbose_name='slag')),
+                ('color', models.CharField(help_text='Цветовой HEX-код', max_length=200, unique=True, verbose_name='цвет')),
+            ],
+            options={
+                'verbose_name': 'тег',
+                'verbose_name_plural': 'теги',
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('dish_recipes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoplist',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_shop_lists', to='dish_recipes.Recipe', verbose_name='рецепт'),
+        ),
+        migrations.AddField(
+            model_name='shoplist',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_shop_lists', to=settings.AUTH_USER_MODEL, verbose_name='автор списка покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipetag',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='dish_recipes.Recipe', verbose_name='рецепт'),
+        ),
+        migrations.AddField(
+            model_name='recipetag',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dish_recipes.Tag', verbose_name='тэг'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='автор'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient',
+            field=models.ManyToManyField(related_name='recipes', to='dish_recipes.IngredientAmount', verbose_name='ингредиенты'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag',
+            field=models.ManyToManyField(related_name='recipes', through='dish_recipes.RecipeTag', to='dish_recipes.Tag', verbose_name='теги'),
+        ),
+        migrations.AddField(
+            model_name='ingredientamount',
+            name='ingredient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredients_amounts', to='dish_recipes.Ingredient', verbose_name='ингредиент'),
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='подписан на'),
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='подписчик'),
+        ),
+        migrations.AddField(
+            model_name='favoritesrecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorite_recipe', to='dish_recipes.Recipe', verbose_name='рецепт'),
+        ),
+        migrations.AddField(
+            model_name='favoritesrecipe',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='в избранном у пользователя'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoplist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_recipe_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='user_not_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoritesrecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='favorite_user_recept_unique'),
+        ),
+    ]
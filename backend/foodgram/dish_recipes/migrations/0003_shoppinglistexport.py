@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dish_recipes', '0002_initial_relations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListExport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'в очереди'), ('running', 'формируется'), ('done', 'готово'), ('failed', 'ошибка')], default='pending', max_length=20, verbose_name='статус')),
+                ('content', models.BinaryField(null=True, verbose_name='файл')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='завершено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_exports', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'выгрузка списка покупок',
+                'verbose_name_plural': 'выгрузки списков покупок',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
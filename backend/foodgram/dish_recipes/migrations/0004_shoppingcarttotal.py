@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_totals(apps, schema_editor):
+    """Итоги для корзин, собранных до появления таблицы."""
+    ShopList = apps.get_model('dish_recipes', 'ShopList')
+    ShoppingCartTotal = apps.get_model('dish_recipes', 'ShoppingCartTotal')
+    rows = ShopList.objects.values_list(
+        'user_id', 'recipe__ingredient__ingredient_id'
+    ).annotate(
+        total=Sum('recipe__ingredient__amount')
+    ).order_by('user_id', 'recipe__ingredient__ingredient_id')
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=total)
+         for user_id, ingredient_id, total in rows.iterator()
+         if ingredient_id is not None),
+        batch_size=(None if schema_editor.connection.vendor == 'sqlite'
+                    else BATCH_SIZE),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dish_recipes', '0003_shoppinglistexport'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='dish_recipes.Ingredient', verbose_name='ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'итог корзины',
+                'verbose_name_plural': 'итоги корзин',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_total'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.models import Sum
+
+BATCH_SIZE = 1000
+
+
+def forward(apps, schema_editor):
+    """
+    Переносим количества из общей таблицы IngredientAmount в строки
+    рецепта. Повторы одного ингредиента в рецепте складываем.
+    """
+    Recipe = apps.get_model('dish_recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('dish_recipes', 'RecipeIngredient')
+    rows = Recipe.ingredient.through.objects.values_list(
+        'recipe_id', 'ingredientamount__ingredient_id'
+    ).annotate(
+        total=Sum('ingredientamount__amount')
+    ).order_by('recipe_id', 'ingredientamount__ingredient_id')
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=total)
+         for recipe_id, ingredient_id, total in rows.iterator()),
+        batch_size=(None if schema_editor.connection.vendor == 'sqlite'
+                    else BATCH_SIZE),
+    )
+
+
+def backward(apps, schema_editor):
+    """Восстанавливаем по строке IngredientAmount на ингредиент рецепта."""
+    Recipe = apps.get_model('dish_recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('dish_recipes', 'RecipeIngredient')
+    IngredientAmount = apps.get_model('dish_recipes', 'IngredientAmount')
+    through = Recipe.ingredient.through
+    for item in RecipeIngredient.objects.order_by('pk').iterator():
+        amount = IngredientAmount.objects.create(
+            ingredient_id=item.ingredient_id, amount=item.amount)
+        through.objects.create(
+            recipe_id=item.recipe_id, ingredientamount_id=amount.pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0005_recipeingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0006_move_ingredient_amounts'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='recipe',
+            name='ingredient',
+        ),
+        migrations.DeleteModel(
+            name='IngredientAmount',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(related_name='recipes', through='dish_recipes.RecipeIngredient', to='dish_recipes.Ingredient', verbose_name='ингредиенты'),
+        ),
+    ]
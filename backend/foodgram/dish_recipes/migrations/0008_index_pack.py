@@ -0,0 +1,59 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0007_remove_ingredientamount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favoritesrecipe',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'name'], name='recipe_author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoplist',
+            index=models.Index(fields=['recipe', 'user'], name='shoplist_recipe_user_idx'),
+        ),
+        migrations.AlterField(
+            model_name='favoritesrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorite_recipe', to='dish_recipes.Recipe', verbose_name='рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='автор'),
+        ),
+        migrations.AlterField(
+            model_name='recipetag',
+            name='tag',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='dish_recipes.Tag', verbose_name='тэг'),
+        ),
+        migrations.AlterField(
+            model_name='shoplist',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_shop_lists', to='dish_recipes.Recipe', verbose_name='рецепт'),
+        ),
+    ]
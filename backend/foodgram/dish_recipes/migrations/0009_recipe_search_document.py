@@ -0,0 +1,69 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:04
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+INDEX_NAME = 'recipe_search_document_gin'
+
+
+def normalize(value):
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def fill_documents(apps, schema_editor):
+    """Поисковые документы для уже существующих рецептов."""
+    Recipe = apps.get_model('dish_recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('dish_recipes', 'RecipeIngredient')
+    names = defaultdict(list)
+    rows = RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient__name').order_by('pk')
+    for recipe_id, name in rows.iterator():
+        names[recipe_id].append(name)
+    batch_size = (None if schema_editor.connection.vendor == 'sqlite'
+                  else BATCH_SIZE)
+    recipes = []
+    for recipe in Recipe.objects.only('id', 'name', 'text').iterator():
+        recipe.search_document = '\n'.join(
+            normalize(part)
+            for part in (recipe.name, recipe.text, *names[recipe.pk]))
+        recipes.append(recipe)
+        if len(recipes) == BATCH_SIZE:
+            Recipe.objects.bulk_update(
+                recipes, ('search_document',), batch_size=batch_size)
+            recipes = []
+    Recipe.objects.bulk_update(
+        recipes, ('search_document',), batch_size=batch_size)
+
+
+def create_search_index(apps, schema_editor):
+    """GIN-индекс по tsvector документа - только на PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON dish_recipes_recipe '
+        f"USING GIN (to_tsvector('russian', search_document))")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0008_index_pack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='поисковый документ'),
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0009_recipe_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.BooleanField(default=False, editable=False, verbose_name='миниатюры готовы'),
+        ),
+    ]
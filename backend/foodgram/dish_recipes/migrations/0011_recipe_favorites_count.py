@@ -0,0 +1,36 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:09
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_favorites_count(apps, schema_editor):
+    """Счетчик избранного для уже существующих рецептов."""
+    Recipe = apps.get_model('dish_recipes', 'Recipe')
+    FavoritesRecipe = apps.get_model('dish_recipes', 'FavoritesRecipe')
+    favorites = FavoritesRecipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(count=Count('pk'))
+    Recipe.objects.update(favorites_count=Coalesce(
+        Subquery(favorites.values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='в избранном'),
+        ),
+        migrations.RunPython(fill_favorites_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+    ]
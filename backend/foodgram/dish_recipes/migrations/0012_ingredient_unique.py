@@ -0,0 +1,102 @@
+# Generated by Django 2.2.28 on 2026-10-18 06:14
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# Не больше 999 параметров в запросе SQLite.
+CHUNK_SIZE = 500
+
+
+def normalize(value):
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def merge_rows(model, owner, keep, duplicates):
+    """
+    Переносим строки model с дублей на ingredient keep. Если у владельца
+    (рецепта, пользователя) уже есть строка с keep, количества
+    складываются в одну строку. Возвращаем владельцев, у которых
+    строки изменились.
+    """
+    rows = model.objects.filter(
+        ingredient_id__in=[keep, *duplicates]).order_by('pk')
+    by_owner = defaultdict(list)
+    for row in rows:
+        by_owner[getattr(row, owner)].append(row)
+    changed = set()
+    for owner_id, owner_rows in by_owner.items():
+        target = next((row for row in owner_rows if row.ingredient_id == keep),
+                      owner_rows[0])
+        extra = [row for row in owner_rows if row is not target]
+        if target.ingredient_id == keep and not extra:
+            continue
+        model.objects.filter(pk__in=[row.pk for row in extra]).delete()
+        target.ingredient_id = keep
+        target.amount += sum(row.amount for row in extra)
+        target.save(update_fields=('ingredient', 'amount'))
+        changed.add(owner_id)
+    return changed
+
+
+def refresh_documents(apps, schema_editor, recipe_ids):
+    """
+    Поисковые документы (миграция 0009) перечисляют ингредиенты рецепта;
+    после склейки дублей пересобираем их у затронутых рецептов.
+    """
+    Recipe = apps.get_model('dish_recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('dish_recipes', 'RecipeIngredient')
+    recipe_ids = sorted(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        names = defaultdict(list)
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=chunk).values_list(
+            'recipe_id', 'ingredient__name').order_by('pk')
+        for recipe_id, name in rows:
+            names[recipe_id].append(name)
+        recipes = list(Recipe.objects.filter(pk__in=chunk).only(
+            'id', 'name', 'text'))
+        for recipe in recipes:
+            recipe.search_document = '\n'.join(
+                normalize(part)
+                for part in (recipe.name, recipe.text, *names[recipe.pk]))
+        Recipe.objects.bulk_update(recipes, ('search_document',))
+
+
+def merge_duplicates(apps, schema_editor):
+    """Склеиваем ингредиенты с одинаковыми названием и единицей."""
+    Ingredient = apps.get_model('dish_recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('dish_recipes', 'RecipeIngredient')
+    ShoppingCartTotal = apps.get_model('dish_recipes', 'ShoppingCartTotal')
+    groups = list(Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), total=Count('pk')).filter(
+        total__gt=1).order_by())
+    recipe_ids = set()
+    for group in groups:
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep']).values_list('pk', flat=True))
+        recipe_ids |= merge_rows(
+            RecipeIngredient, 'recipe_id', group['keep'], duplicates)
+        merge_rows(ShoppingCartTotal, 'user_id', group['keep'], duplicates)
+        Ingredient.objects.filter(pk__in=duplicates).delete()
+    if recipe_ids:
+        refresh_documents(apps, schema_editor, recipe_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dish_recipes', '0011_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -1,8 +1,13 @@
+import datetime
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import F, Q
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Q, Subquery, Value, Window)
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -50,29 +55,74 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class IngredientAmount(models.Model):
-    """Модель для связи ингредиентов и их количества в рецепте."""
-    ingredient = models.ForeignKey(
-        Ingredient,
-        on_delete=models.CASCADE,
-        verbose_name='ингредиент',
-        related_name='ingredients_amounts',
-    )
-    amount = models.PositiveIntegerField(
-        verbose_name='количество ингредиента',
-    )
-
-    class Meta:
-        verbose_name = 'количество ингредиента в рецепте'
-        verbose_name_plural = 'количество ингредиентов в рецепте'
-
-    def __str__(self):
-        return self.ingredient.name
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для отображения в API."""
+
+    def with_related(self):
+        """Автор, теги и ингредиенты подгружаются заранее."""
+        return self.select_related('author').prefetch_related(
+            'tag',
+            Prefetch('recipe_ingredients',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient')),
+        )
+
+    def with_user_flags(self, user):
+        """
+        Признаки избранного, корзины и подписки на автора для user,
+        посчитанные подзапросами Exists.
+        """
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(is_favorited=false,
+                                 is_in_shopping_cart=false,
+                                 author_is_subscribed=false)
+        return self.annotate(
+            is_favorited=Exists(FavoritesRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShopList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def refresh_favorites_count(self):
+        """Пересчитываем счетчик избранного по таблице избранного."""
+        favorites = FavoritesRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(count=Count('pk'))
+        return self.update(favorites_count=Coalesce(
+            Subquery(favorites.values('count')), 0))
+
+    def first_by_author(self, limit):
+        """
+        Первые limit рецептов каждого автора одним запросом. Django не
+        умеет фильтровать по оконной функции, поэтому нумерацию
+        ROW_NUMBER() OVER (PARTITION BY author) строим через ORM,
+        а отбор по номеру делаем во внешнем запросе.
+        """
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        ))
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s ORDER BY ranked.row_number',
+            (*params, limit),
+        )
 
 
 class Recipe(models.Model):
@@ -82,6 +132,7 @@ class Recipe(models.Model):
         verbose_name='автор',
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False,
     )
     name = models.CharField(
         verbose_name='название',
@@ -95,9 +146,15 @@ class Recipe(models.Model):
         verbose_name='изображение',
         upload_to='recipes/',
     )
-    ingredient = models.ManyToManyField(
-        IngredientAmount,
+    image_variants = models.BooleanField(
+        verbose_name='миниатюры готовы',
+        default=False,
+        editable=False,
+    )
+    ingredients = models.ManyToManyField(
+        Ingredient,
         related_name='recipes',
+        through='RecipeIngredient',
         verbose_name='ингредиенты',
     )
     tag = models.ManyToManyField(
@@ -114,16 +171,86 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='дата публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='в избранном',
+        default=0,
+        editable=False,
+    )
+    search_document = models.TextField(
+        verbose_name='поисковый документ',
+        blank=True,
+        default='',
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'pецепт'
         verbose_name_plural = 'pецепты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'name'],
+                name='recipe_author_name_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeIngredient(models.Model):
+    """Модель для связи рецепта, ингредиента и его количества."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients',
+        verbose_name='рецепт',
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients',
+        verbose_name='ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='количество ингредиента',
+    )
+
+    class Meta:
+        verbose_name = 'количество ингредиента в рецепте'
+        verbose_name_plural = 'количество ингредиентов в рецепте'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='recipe_ingredient_amount_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient.name}: {self.amount}'
+
+
 class RecipeTag(models.Model):
     """Модель для связи рецептов и тегов."""
     recipe = models.ForeignKey(
@@ -135,12 +262,19 @@ class RecipeTag(models.Model):
     tag = models.ForeignKey(
         Tag,
         on_delete=models.CASCADE,
-        verbose_name='тэг'
+        verbose_name='тэг',
+        db_index=False,
     )
 
     class Meta:
         verbose_name = 'pецепт/тэг'
         verbose_name_plural = 'pецепты/тэги'
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipetag_tag_recipe_idx'
+            )
+        ]
 
 
 class Follow(models.Model):
@@ -184,7 +318,8 @@ class FavoritesRecipe(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='favorite_recipe',
-        verbose_name='рецепт'
+        verbose_name='рецепт',
+        db_index=False,
     )
 
     class Meta:
@@ -195,6 +330,12 @@ class FavoritesRecipe(models.Model):
                 fields=['user', 'recipe'], name='favorite_user_recept_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx'
+            )
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe} в избранном у {self.user}'
@@ -212,7 +353,8 @@ class ShopList(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='recipe_shop_lists',
-        verbose_name='рецепт'
+        verbose_name='рецепт',
+        db_index=False,
     )
 
     class Meta:
@@ -223,6 +365,116 @@ class ShopList(models.Model):
                 fields=['user', 'recipe'], name='unique_recipe_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shoplist_recipe_user_idx'
+            )
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe} в списке покупок {self.user}'
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Суммарное количество ингредиента в корзине пользователя.
+    Поддерживается при изменении корзины, чтобы список покупок
+    читался одним запросом.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='количество',
+    )
+
+    class Meta:
+        verbose_name = 'итог корзины'
+        verbose_name_plural = 'итоги корзин'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'], name='unique_cart_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.amount} у {self.user}'
+
+
+class ShoppingListExportQuerySet(models.QuerySet):
+    """Выгрузка доступна SHOPPING_LIST_EXPORT_TTL секунд после создания."""
+
+    @staticmethod
+    def expiry_cutoff():
+        return timezone.now() - datetime.timedelta(
+            seconds=settings.SHOPPING_LIST_EXPORT_TTL)
+
+    def expired(self):
+        return self.filter(created__lt=self.expiry_cutoff())
+
+    def active(self):
+        return self.filter(created__gte=self.expiry_cutoff())
+
+
+class ShoppingListExport(models.Model):
+    """Задание на фоновую выгрузку списка покупок в PDF."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'в очереди'),
+        (RUNNING, 'формируется'),
+        (DONE, 'готово'),
+        (FAILED, 'ошибка'),
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_exports',
+        verbose_name='пользователь'
+    )
+    status = models.CharField(
+        verbose_name='статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    content = models.BinaryField(
+        verbose_name='файл',
+        null=True,
+        editable=False,
+    )
+    error = models.TextField(
+        verbose_name='ошибка',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='создано',
+    )
+    finished = models.DateTimeField(
+        verbose_name='завершено',
+        null=True,
+        blank=True,
+    )
+
+    objects = ShoppingListExportQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'выгрузка списка покупок'
+        verbose_name_plural = 'выгрузки списков покупок'
+
+    def __str__(self):
+        return f'Выгрузка {self.pk} для {self.user}: {self.status}'
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def estimated_count(queryset):
+    """
+    Оценка числа строк таблицы из статистики планировщика PostgreSQL
+    или None, если оценка неприменима: другой бэкенд, выборка
+    с фильтрами или таблица еще не анализировалась.
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.has_filters():
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админки: для больших нефильтрованных таблиц число
+    строк берется из pg_class.reltuples, чтобы не делать COUNT(*) по всей
+    таблице на каждой странице. Маленькие таблицы и отфильтрованные
+    выборки считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if (estimate is not None
+                and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD):
+            return estimate
+        return super().count
@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from .models import Recipe
+
+# Django 2.2 не ограничивает явный batch_size лимитами SQLite (не больше
+# 500 строк в составном SELECT), поэтому там оставляем размер пачки Django.
+BATCH_SIZE = None if connection.vendor == 'sqlite' else 1000
+
+
+def bulk_create_with_pk(model, objs):
+    """
+    bulk_create, после которого у объектов гарантированно есть pk.
+
+    Бэкенды без RETURNING (SQLite) дочитывают только что вставленные
+    строки, поэтому на них функцию вызывают внутри транзакции, которая
+    уже держит блокировку на запись.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return list(model.objects.filter(pk__gt=last or 0).order_by('pk'))
+
+
+def chunked(rows, size):
+    """Разбиваем поток строк на пачки не больше size."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def favorites_count_refreshed(favorites):
+    """
+    Пересчитываем счетчики избранного у рецептов из выборки favorites
+    после блока, в котором эти записи удаляются каскадом (например,
+    вместе с пользователем).
+    """
+    recipe_ids = list(
+        favorites.values_list('recipe_id', flat=True).distinct())
+    with transaction.atomic():
+        yield
+        for start in range(0, len(recipe_ids), 500):
+            Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + 500]
+            ).refresh_favorites_count()
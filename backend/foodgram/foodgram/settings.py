@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -33,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +76,82 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    }
+}
+
+# Справочники (теги, ингредиенты): время жизни готовых ответов в кеше
+# и max-age для клиентов и nginx.
+REFERENCE_DATA_CACHE_TIMEOUT = 24 * 60 * 60
+REFERENCE_DATA_MAX_AGE = int(os.getenv('REFERENCE_DATA_MAX_AGE', 60))
+
+# Ответы ленты рецептов для анонимных посетителей. Изменения рецептов
+# сбрасывают кеш сразу, счетчик избранного подставляется при чтении,
+# а порядок ?ordering=popular может отставать на этот срок.
+ANONYMOUS_CACHE_TIMEOUT = int(os.getenv('ANONYMOUS_CACHE_TIMEOUT', 5 * 60))
+
+# Готовые PDF со списком покупок, ключ - хеш содержимого корзины.
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = 60 * 60
+
+# Сколько секунд хранится фоновая выгрузка списка покупок. Просроченные
+# выгрузки пользователя удаляются при его следующей выгрузке, остальные -
+# командой cleanup_orphans.
+SHOPPING_LIST_EXPORT_TTL = int(
+    os.getenv('SHOPPING_LIST_EXPORT_TTL', 24 * 60 * 60))
+
+# Пул потоков для фоновых задач (выгрузка списков покупок, изображения).
+BACKGROUND_TASKS_WORKERS = int(os.getenv('BACKGROUND_TASKS_WORKERS', 2))
+BACKGROUND_TASKS_EAGER = False
+
+# Изображения рецептов: лимиты на загрузку (байты и пиксели по стороне)
+# и размер миниатюр для карточек в списках.
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 4096))
+RECIPE_THUMBNAIL_SIZE = 480
+
+# Замер запросов (Server-Timing и лог foodgram.performance). Запросы,
+# в которых SQL больше порога, пишутся в лог предупреждением.
+PERFORMANCE_TIMING = os.getenv('PERFORMANCE_TIMING', '') == '1'
+PERFORMANCE_QUERY_THRESHOLD = int(
+    os.getenv('PERFORMANCE_QUERY_THRESHOLD', 30))
+
+# Метрики Prometheus на /api/metrics. Каждый воркер сбрасывает свои
+# значения в файл METRICS_DIR не реже METRICS_FLUSH_INTERVAL секунд,
+# при чтении файлы суммируются, а файлы завершившихся воркеров
+# сливаются в архив. С METRICS_TOKEN нужен заголовок
+# Authorization: Bearer <токен>.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '') == '1'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics'))
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# Списки в админке: начиная с такого числа строк нефильтрованная таблица
+# считается по статистике PostgreSQL (pg_class.reltuples), а не COUNT(*).
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.'
@@ -0,0 +1,30 @@
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+SECRET_KEY = 'test-secret-key'
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+BACKGROUND_TASKS_EAGER = True
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
+
+METRICS_DIR = tempfile.mkdtemp(prefix='foodgram-metrics-')
@@ -0,0 +1,156 @@
+import base64
+import io
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from dish_recipes.models import (FavoritesRecipe, Follow, Ingredient,
+                                 Recipe, RecipeIngredient, RecipeTag,
+                                 ShopList, Tag)
+from users.models import CustomUser
+
+AUTHORS_COUNT = 4
+RECIPES_PER_AUTHOR = 5
+INGREDIENTS_PER_RECIPE = 5
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+
+
+class QueryCounter:
+    """Считает SQL-запросы, выполненные внутри вызова."""
+
+    def __call__(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = func(*args, **kwargs)
+        return response, len(context.captured_queries)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def count_queries():
+    return QueryCounter()
+
+
+@pytest.fixture
+def user():
+    return CustomUser.objects.create_user(
+        username='reader', email='reader@foodgram.ru', password='pass',
+        first_name='Иван', last_name='Читатель',
+    )
+
+
+@pytest.fixture
+def client_anon():
+    return APIClient()
+
+
+@pytest.fixture
+def client_auth(user):
+    client = APIClient()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [Tag.objects.create(name=name, slug=slug, color=color)
+            for name, slug, color in TAGS]
+
+
+@pytest.fixture
+def ingredients():
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {index:02}', measurement_unit='г')
+        for index in range(30)
+    )
+    return list(Ingredient.objects.all())
+
+
+@pytest.fixture
+def authors():
+    return [
+        CustomUser.objects.create_user(
+            username=f'author{index}', email=f'author{index}@foodgram.ru',
+            password='pass', first_name='Автор', last_name=str(index),
+        )
+        for index in range(AUTHORS_COUNT)
+    ]
+
+
+@pytest.fixture
+def recipes(authors, tags, ingredients):
+    """Рецепты авторов с тегами и ингредиентами."""
+    result = []
+    for author_index, author in enumerate(authors):
+        for index in range(RECIPES_PER_AUTHOR):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {author_index}-{index}',
+                text='Описание рецепта',
+                image='recipes/test.png',
+                cooking_time=10 + index,
+            )
+            RecipeTag.objects.create(
+                recipe=recipe, tag=tags[index % len(tags)])
+            RecipeTag.objects.create(
+                recipe=recipe, tag=tags[(index + 1) % len(tags)])
+            for offset in range(INGREDIENTS_PER_RECIPE):
+                ingredient = ingredients[
+                    (index * INGREDIENTS_PER_RECIPE + offset)
+                    % len(ingredients)]
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=offset + 1)
+            result.append(recipe)
+    return result
+
+
+@pytest.fixture
+def dataset(user, authors, recipes):
+    """Подписки, избранное и корзина читателя поверх рецептов."""
+    for author in authors:
+        Follow.objects.create(user=user, author=author)
+    for recipe in recipes[::2]:
+        FavoritesRecipe.objects.create(user=user, recipe=recipe)
+    for recipe in recipes[::3]:
+        ShopList.objects.create(user=user, recipe=recipe)
+    return recipes
+
+
+@pytest.fixture
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), color='red').save(buffer, format='PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@pytest.fixture
+def recipe_payload(tags, ingredients, image_base64):
+    def make(ingredients_count=INGREDIENTS_PER_RECIPE, name='Новый рецепт'):
+        return {
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': image_base64,
+            'tags': [tag.id for tag in tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in ingredients[:ingredients_count]
+            ],
+        }
+    return make
@@ -0,0 +1,116 @@
+import pytest
+from django.test import Client
+
+from dish_recipes import paginator
+from dish_recipes.models import (Recipe, RecipeIngredient, RecipeTag,
+                                 ShopList, ShoppingCartTotal)
+from dish_recipes.paginator import estimated_count
+from users.models import CustomUser
+
+pytestmark = pytest.mark.django_db
+
+RECIPES_URL = '/admin/dish_recipes/recipe/'
+
+
+@pytest.fixture
+def admin_client():
+    admin = CustomUser.objects.create_superuser(
+        username='admin', email='admin@foodgram.ru', password='pass')
+    client = Client()
+    client.force_login(admin)
+    return client
+
+
+def add_recipes(recipe, tags, ingredients, count):
+    for index in range(count):
+        new = Recipe.objects.create(
+            author=recipe.author, name=f'Еще рецепт {index}', text='-',
+            image=recipe.image, cooking_time=5)
+        RecipeTag.objects.create(recipe=new, tag=tags[index % len(tags)])
+        RecipeIngredient.objects.create(
+            recipe=new, ingredient=ingredients[index], amount=1)
+
+
+def test_recipe_changelist_does_not_grow(admin_client, recipes, tags,
+                                         ingredients, count_queries):
+    response, few = count_queries(admin_client.get, RECIPES_URL)
+    assert response.status_code == 200
+    add_recipes(recipes[0], tags, ingredients, 10)
+    response, many = count_queries(admin_client.get, RECIPES_URL)
+    assert response.status_code == 200
+    assert few == many
+
+
+def test_recipe_change_form_uses_autocomplete(admin_client, recipes):
+    recipe = recipes[0]
+    response = admin_client.get(f'{RECIPES_URL}{recipe.id}/change/')
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert 'admin-autocomplete' in content
+    used = {item.ingredient.name for item in recipe.recipe_ingredients.all()}
+    assert not any(f'>ингредиент {index:02}<' in content
+                   for index in range(30)
+                   if f'ингредиент {index:02}' not in used)
+
+
+def test_changelist_uses_estimated_count(admin_client, recipes, settings,
+                                         monkeypatch):
+    settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 1000
+    monkeypatch.setattr(paginator, 'estimated_count', lambda queryset: 54321)
+    response = admin_client.get(RECIPES_URL)
+    assert response.status_code == 200
+    assert '54321' in response.content.decode()
+
+    settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 10 ** 6
+    response = admin_client.get(RECIPES_URL)
+    assert '54321' not in response.content.decode()
+
+
+def test_estimated_count_falls_back_to_exact(recipes):
+    assert estimated_count(Recipe.objects.all()) is None
+    assert estimated_count(Recipe.objects.filter(name='Рецепт 0-0')) is None
+
+
+def cart_amount(user, item):
+    return ShoppingCartTotal.objects.get(
+        user=user, ingredient=item.ingredient).amount
+
+
+def test_inline_amount_change_updates_carts(admin_client, user, recipes):
+    recipe = recipes[0]
+    ShopList.objects.create(user=user, recipe=recipe)
+    items = list(recipe.recipe_ingredients.order_by('pk'))
+    data = {
+        'author': recipe.author_id, 'name': recipe.name,
+        'text': recipe.text, 'cooking_time': recipe.cooking_time,
+        'recipe_ingredients-TOTAL_FORMS': len(items),
+        'recipe_ingredients-INITIAL_FORMS': len(items),
+        'recipe_ingredients-MIN_NUM_FORMS': 0,
+        'recipe_ingredients-MAX_NUM_FORMS': 1000,
+    }
+    for index, item in enumerate(items):
+        data.update({
+            f'recipe_ingredients-{index}-id': item.pk,
+            f'recipe_ingredients-{index}-recipe': recipe.pk,
+            f'recipe_ingredients-{index}-ingredient': item.ingredient_id,
+            f'recipe_ingredients-{index}-amount': (
+                999 if index == 0 else item.amount),
+        })
+    response = admin_client.post(f'{RECIPES_URL}{recipe.id}/change/', data)
+    assert response.status_code == 302
+    assert cart_amount(user, items[0]) == 999
+
+
+def test_recipe_ingredient_admin_updates_carts(admin_client, user, recipes):
+    recipe = recipes[0]
+    ShopList.objects.create(user=user, recipe=recipe)
+    item = recipe.recipe_ingredients.first()
+    url = f'/admin/dish_recipes/recipeingredient/{item.pk}/'
+    response = admin_client.post(f'{url}change/', {
+        'recipe': recipe.pk, 'ingredient': item.ingredient_id,
+        'amount': 999})
+    assert response.status_code == 302
+    assert cart_amount(user, item) == 999
+    admin_client.post(f'{url}delete/', {'post': 'yes'})
+    assert not ShoppingCartTotal.objects.filter(
+        user=user, ingredient=item.ingredient).exists()
@@ -0,0 +1,118 @@
+import pytest
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import transaction
+
+from api.bulk import RecipeImporter
+from api.caching import VERSION_KEY, get_version
+from dish_recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+def test_repeated_anonymous_request_is_cached(client_anon, recipes,
+                                              count_queries):
+    first = client_anon.get(URL, {'limit': 3})
+    second, queries = count_queries(client_anon.get, URL, {'limit': 3})
+    # только счетчики избранного
+    assert queries == 1
+    assert second.content == first.content
+    detail = f'{URL}{recipes[0].id}/'
+    assert client_anon.get(detail).json()['id'] == recipes[0].id
+    _, queries = count_queries(client_anon.get, detail)
+    assert queries == 1
+
+
+def test_query_params_are_normalized(client_anon, recipes, count_queries):
+    client_anon.get(f'{URL}?tags=breakfast&tags=lunch&limit=3')
+    response, queries = count_queries(
+        client_anon.get, f'{URL}?limit=3&tags=lunch&tags=breakfast')
+    assert queries == 1
+    _, queries = count_queries(
+        client_anon.get, f'{URL}?limit=3&tags=lunch')
+    assert queries > 1
+
+
+def test_authenticated_responses_are_not_cached(client_auth, dataset,
+                                                count_queries):
+    client_auth.get(URL)
+    response, queries = count_queries(client_auth.get, URL)
+    assert queries > 0
+    assert any(item['is_favorited'] for item in response.json()['results'])
+
+
+def test_errors_are_not_cached(client_anon, count_queries):
+    assert client_anon.get(f'{URL}0/').status_code == 404
+    _, queries = count_queries(client_anon.get, f'{URL}0/')
+    assert queries > 0
+
+
+def names(client):
+    return [item['name'] for item in client.get(URL).json()['results']]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('change', (
+    lambda recipe: Recipe.objects.filter(pk=recipe.pk).first().save(),
+    lambda recipe: RecipeTag.objects.filter(recipe=recipe).delete(),
+    lambda recipe: RecipeIngredient.objects.filter(
+        recipe=recipe).first().save(),
+    lambda recipe: recipe.tag.first().save(),
+    lambda recipe: recipe.ingredients.first().save(),
+    lambda recipe: recipe.author.save(),
+))
+def test_changes_invalidate_feed(client_anon, recipes, count_queries,
+                                 change):
+    client_anon.get(URL)
+    change(recipes[0])
+    _, queries = count_queries(client_anon.get, URL)
+    assert queries > 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_login_keeps_feed(client_anon, recipes, count_queries):
+    client_anon.get(URL)
+    author = recipes[0].author
+    user_logged_in.send(sender=type(author), request=None, user=author)
+    _, queries = count_queries(client_anon.get, URL)
+    assert queries == 1
+
+
+def test_favorites_count_is_fresh_on_cached_feed(client_anon, client_auth,
+                                                 recipes, count_queries):
+    recipe = recipes[0]
+    detail = f'{URL}{recipe.id}/'
+
+    def counts():
+        response, queries = count_queries(client_anon.get, detail)
+        assert queries == 1
+        return response.json()['favorites_count']
+
+    client_anon.get(detail)
+    before = counts()
+    client_auth.post(f'{detail}favorite/')
+    assert counts() == before + 1
+    client_auth.delete(f'{detail}favorite/')
+    assert counts() == before
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cascade_bumps_version_once(recipes):
+    version = get_version('recipes')
+    with transaction.atomic():
+        recipes[0].author.delete()
+    assert cache.get(VERSION_KEY.format('recipes')) == version + 1
+
+
+def test_bulk_import_invalidates_feed(client_anon, recipes):
+    client_anon.get(URL)
+    line = (
+        '{"author": "author0", "name": "Импортированный", "text": "Текст", '
+        '"image": "recipes/test.png", "cooking_time": 5, '
+        '"tags": ["lunch"], "ingredients": [{"name": "ингредиент 00", '
+        '"measurement_unit": "г", "amount": 1}]}'
+    )
+    assert RecipeImporter().run([line])['created'] == 1
+    assert 'Импортированный' in names(client_anon)
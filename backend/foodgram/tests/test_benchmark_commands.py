@@ -0,0 +1,73 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from dish_recipes.management.commands.benchmark_api import percentile
+from dish_recipes.models import (FavoritesRecipe, Follow, Recipe,
+                                 RecipeIngredient, ShopList)
+from users.models import CustomUser
+
+pytestmark = pytest.mark.django_db
+
+GENERATE_OPTIONS = {
+    'users': 4, 'recipes': 3, 'ingredients': 4, 'follows': 2,
+    'favorites': 3, 'cart': 2, 'seed': 7,
+}
+
+
+def snapshot():
+    return sorted(Recipe.objects.values_list(
+        'author__username', 'name', 'cooking_time'))
+
+
+def test_generate_data_creates_dataset():
+    call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    assert CustomUser.objects.count() == 4
+    assert Recipe.objects.count() == 12
+    assert RecipeIngredient.objects.count() == 48
+    assert Follow.objects.count() == 8
+    assert FavoritesRecipe.objects.count() == 12
+    assert ShopList.objects.count() == 8
+
+
+def test_generate_data_is_reproducible():
+    call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    first = snapshot()
+    call_command('generate_data', stdout=StringIO(), flush=True,
+                 **GENERATE_OPTIONS)
+    assert snapshot() == first
+
+
+def test_generate_data_requires_flush_to_repeat():
+    call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    with pytest.raises(CommandError, match='--flush'):
+        call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    assert CustomUser.objects.count() == 4
+
+
+def test_benchmark_reports_percentiles():
+    call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    out = StringIO()
+    call_command('benchmark_api', requests=3, warmup=0, stdout=out)
+    report = json.loads(out.getvalue())
+    endpoint = report['endpoints']['recipes-list']
+    assert endpoint['status_codes'] == {'200': 3}
+    assert endpoint['p50_ms'] <= endpoint['p95_ms'] <= endpoint['p99_ms']
+    assert report['endpoints']['users-subscriptions']['status_codes'] == {
+        '200': 3}
+
+
+def test_benchmark_requires_requests():
+    call_command('generate_data', stdout=StringIO(), **GENERATE_OPTIONS)
+    with pytest.raises(CommandError, match='--requests'):
+        call_command('benchmark_api', requests=0, stdout=StringIO())
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([5], 95) == 5
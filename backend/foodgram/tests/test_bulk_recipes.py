@@ -0,0 +1,138 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.bulk import CONTENT_TYPE
+from dish_recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import CustomUser
+
+pytestmark = pytest.mark.django_db
+
+EXPORT_URL = '/api/recipes/export/'
+IMPORT_URL = '/api/recipes/import/'
+
+
+@pytest.fixture
+def client_staff():
+    staff = CustomUser.objects.create_user(
+        username='staff', email='staff@foodgram.ru', password='pass',
+        is_staff=True)
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=staff).key}')
+    return client
+
+
+def export(client):
+    response = client.get(EXPORT_URL)
+    assert response.status_code == 200
+    assert response.streaming
+    assert response['Content-Type'] == CONTENT_TYPE
+    return b''.join(response.streaming_content).decode()
+
+
+def post(client, content):
+    return client.post(IMPORT_URL, content.encode(),
+                       content_type=CONTENT_TYPE)
+
+
+def test_bulk_endpoints_are_staff_only(client_anon, client_auth):
+    assert client_anon.get(EXPORT_URL).status_code == 401
+    assert client_auth.get(EXPORT_URL).status_code == 403
+    assert post(client_auth, '').status_code == 403
+
+
+def test_export_streams_in_chunks(client_staff, recipes, count_queries,
+                                  monkeypatch):
+    monkeypatch.setattr('api.bulk.EXPORT_CHUNK_SIZE', 8)
+    (_, content), queries = count_queries(
+        lambda: (None, export(client_staff)))
+    lines = content.splitlines()
+    assert len(lines) == len(recipes)
+    record = json.loads(lines[0])
+    recipe = Recipe.objects.order_by('pk').first()
+    assert record['author'] == recipe.author.username
+    assert sorted(record['tags']) == sorted(
+        recipe.tag.values_list('slug', flat=True))
+    assert len(record['ingredients']) == recipe.recipe_ingredients.count()
+    # токен + рецепты курсором + теги и ингредиенты на каждую из 3 пачек
+    assert queries == 1 + 1 + 2 * 3
+
+
+def test_round_trip(client_staff, recipes):
+    content = export(client_staff)
+    before = sorted(RecipeIngredient.objects.values_list(
+        'recipe__name', 'ingredient__name', 'amount'))
+    Recipe.objects.all().delete()
+
+    response = post(client_staff, content)
+    assert response.status_code == 200
+    assert response.data == {'created': len(recipes), 'updated': 0,
+                             'failed': 0, 'errors': []}
+    assert sorted(RecipeIngredient.objects.values_list(
+        'recipe__name', 'ingredient__name', 'amount')) == before
+    recipe = Recipe.objects.get(name=recipes[0].name)
+    assert recipe.pub_date == recipes[0].pub_date
+    assert recipe.search_document
+
+    response = post(client_staff, content)
+    assert response.data['created'] == 0
+    assert response.data['updated'] == len(recipes)
+
+
+def test_import_updates_and_reports_errors(client_staff, recipes):
+    record = json.loads(export(client_staff).splitlines()[0])
+    record['ingredients'] = [
+        {'name': 'новый продукт', 'measurement_unit': 'г', 'amount': 7}]
+    unknown_author = dict(record, author='nobody', name='Чужой')
+    unknown_tag = dict(record, name='С тегом', tags=['brunch'])
+    lines = [json.dumps(record), '{broken', '',
+             json.dumps(unknown_author), json.dumps(unknown_tag),
+             json.dumps(dict(record, cooking_time=0))]
+    response = post(client_staff, '\n'.join(lines))
+    assert response.status_code == 200
+    assert response.data['updated'] == 1
+    assert response.data['failed'] == 4
+    assert [error['line'] for error in response.data['errors']] == [
+        2, 4, 5, 6]
+    assert 'author' in response.data['errors'][1]['errors']
+    assert 'tags' in response.data['errors'][2]['errors']
+    recipe = Recipe.objects.get(author__username=record['author'],
+                                name=record['name'])
+    assert list(recipe.recipe_ingredients.values_list(
+        'ingredient__name', 'amount')) == [('новый продукт', 7)]
+    assert Ingredient.objects.filter(name='новый продукт').exists()
+
+
+def test_import_reports_duplicates_and_foreign_images(client_staff, recipes):
+    record = json.loads(export(client_staff).splitlines()[0])
+    lines = [json.dumps(record), json.dumps(dict(record, cooking_time=99)),
+             json.dumps(dict(record, name='Пароли', image='/etc/passwd')),
+             json.dumps(dict(record, name='Выше',
+                             image='recipes/../../settings.py'))]
+    response = post(client_staff, '\n'.join(lines))
+    assert response.data['updated'] == 1
+    assert [error['line'] for error in response.data['errors']] == [2, 3, 4]
+    assert 'строке 1' in response.data['errors'][0]['errors']['name'][0]
+    assert all('image' in error['errors']
+               for error in response.data['errors'][1:])
+    assert Recipe.objects.get(
+        author__username=record['author'],
+        name=record['name']).cooking_time == record['cooking_time']
+    assert not Recipe.objects.filter(name__in=['Пароли', 'Выше']).exists()
+
+
+def test_command_round_trip(recipes, tmp_path):
+    path = str(tmp_path / 'recipes.ndjson')
+    call_command('recipes_ndjson', 'export', '--file', path,
+                 '--chunk-size', '6', stderr=StringIO())
+    Recipe.objects.all().delete()
+    out = StringIO()
+    call_command('recipes_ndjson', 'import', '--file', path,
+                 '--batch-size', '7', stdout=out)
+    assert f'Создано рецептов: {len(recipes)}' in out.getvalue()
+    assert Recipe.objects.count() == len(recipes)
@@ -0,0 +1,126 @@
+import datetime
+import os
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from dish_recipes.models import (RecipeIngredient, ShopList,
+                                 ShoppingCartTotal, ShoppingListExport)
+from users.models import CustomUser
+
+pytestmark = pytest.mark.django_db
+
+
+def totals(user):
+    return dict(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'))
+
+
+def test_recipe_delete_does_not_grow_with_carts(client_auth, user, authors,
+                                                recipe_payload,
+                                                count_queries):
+    deletes = []
+    for name in ('Первый', 'Второй'):
+        client_auth.post('/api/recipes/', recipe_payload(name=name),
+                         format='json')
+        recipe = user.recipes.get(name=name)
+        buyers = authors if name == 'Второй' else authors[:1]
+        for buyer in buyers:
+            ShopList.objects.create(user=buyer, recipe=recipe)
+        response, queries = count_queries(
+            client_auth.delete, f'/api/recipes/{recipe.id}/')
+        assert response.status_code == 204
+        deletes.append(queries)
+    assert deletes[0] == deletes[1]
+    assert not RecipeIngredient.objects.exists()
+    assert not ShoppingCartTotal.objects.exists()
+
+
+def test_user_delete_updates_other_carts(client_auth, user, authors,
+                                         recipe_payload):
+    client_auth.post('/api/recipes/', recipe_payload(), format='json')
+    own = user.recipes.get()
+    other = authors[0].recipes.create(
+        name='Чужой', text='-', image='recipes/test.png', cooking_time=5)
+    ShopList.objects.create(user=authors[1], recipe=own)
+    ShopList.objects.create(user=authors[1], recipe=other)
+    RecipeIngredient.objects.create(
+        recipe=other, ingredient_id=own.recipe_ingredients.first()
+        .ingredient_id, amount=3)
+
+    response = client_auth.delete('/api/users/me/',
+                                  {'current_password': 'pass'},
+                                  format='json')
+    assert response.status_code == 204
+    assert not CustomUser.objects.filter(pk=user.pk).exists()
+    assert list(totals(authors[1]).values()) == [3]
+
+
+def write_media(name, age):
+    path = os.path.join(settings.MEDIA_ROOT, 'recipes', name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(b'x' * 10)
+    moment = (timezone.now() - age).timestamp()
+    os.utime(path, (moment, moment))
+    return path
+
+
+@pytest.fixture
+def orphans(user, dataset):
+    old = ShoppingListExport.objects.create(user=user)
+    ShoppingListExport.objects.filter(pk=old.pk).update(
+        created=timezone.now() - datetime.timedelta(days=30))
+    fresh = ShoppingListExport.objects.create(user=user)
+    stale_user = CustomUser.objects.create_user(
+        username='stale', email='stale@foodgram.ru', password='pass')
+    ShoppingCartTotal.objects.create(
+        user=stale_user, ingredient_id=dataset[0].recipe_ingredients.first()
+        .ingredient_id, amount=5)
+    files = {
+        'used': write_media('test.png', datetime.timedelta(days=1)),
+        'orphan': write_media('orphan.png', datetime.timedelta(days=1)),
+        'fresh': write_media('fresh.png', datetime.timedelta()),
+    }
+    yield {'old': old, 'fresh': fresh, 'stale_user': stale_user,
+           'files': files}
+    for path in files.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_cleanup_orphans(user, orphans):
+    before = totals(user)
+    out = StringIO()
+    call_command('cleanup_orphans', batch_size=1, images=True, stdout=out)
+
+    assert list(ShoppingListExport.objects.values_list('pk', flat=True)) == [
+        orphans['fresh'].pk]
+    assert not ShoppingCartTotal.objects.filter(
+        user=orphans['stale_user']).exists()
+    assert totals(user) == before
+    files = orphans['files']
+    assert os.path.exists(files['used']) and os.path.exists(files['fresh'])
+    assert not os.path.exists(files['orphan'])
+    assert 'выгрузок: 1, итогов корзин: 1, файлов: 1' in out.getvalue()
+
+
+def test_cleanup_orphans_dry_run(orphans):
+    out = StringIO()
+    call_command('cleanup_orphans', dry_run=True, images=True, stdout=out)
+    assert ShoppingListExport.objects.count() == 2
+    assert ShoppingCartTotal.objects.filter(
+        user=orphans['stale_user']).exists()
+    assert os.path.exists(orphans['files']['orphan'])
+    assert ('Будет удалено выгрузок: 1, итогов корзин: 1, файлов: 1'
+            in out.getvalue())
+
+
+def test_cleanup_orphans_keeps_images_by_default(orphans):
+    out = StringIO()
+    call_command('cleanup_orphans', stdout=out)
+    assert os.path.exists(orphans['files']['orphan'])
+    assert 'файлов' not in out.getvalue()
@@ -0,0 +1,50 @@
+import re
+
+import pytest
+from reportlab.pdfbase import pdfmetrics
+
+from api import download_pdf as pdf
+
+PAGE = re.compile(rb'/Type /Page\b(?!s)')
+
+
+def pages(buffer):
+    return len(PAGE.findall(buffer.getvalue()))
+
+
+def test_short_list_fits_one_page():
+    assert pages(pdf.download_pdf(['соль -- 5 г'])) == 1
+
+
+def test_long_list_is_paginated():
+    items = [f'ингредиент {index} -- {index} г' for index in range(300)]
+    assert pages(pdf.download_pdf(items)) > 1
+
+
+def test_long_line_is_wrapped():
+    buffer = pdf.download_pdf(['очень длинное название ' * 20 + '-- 1 г'])
+    assert pages(buffer) == 1
+
+
+def test_unchanged_cart_is_served_from_cache(monkeypatch):
+    items = ['мука -- 500 г', 'сахар -- 100 г']
+    first = pdf.download_pdf(items).getvalue()
+
+    def fail(*args, **kwargs):
+        pytest.fail('PDF перерисован для неизмененной корзины')
+
+    monkeypatch.setattr(pdf, 'render_pdf', fail)
+    assert pdf.download_pdf(items).getvalue() == first
+
+
+def test_changed_cart_is_rendered_again():
+    first = pdf.download_pdf(['мука -- 500 г']).getvalue()
+    assert pdf.download_pdf(['мука -- 600 г']).getvalue() != first
+
+
+def test_font_is_registered_once(monkeypatch):
+    pdf.register_font()
+    calls = []
+    monkeypatch.setattr(pdfmetrics, 'registerFont', calls.append)
+    pdf.register_font()
+    assert calls == []
@@ -0,0 +1,36 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.views import RecipeViewSet
+
+pytestmark = pytest.mark.django_db
+
+
+def test_explain_reports_every_endpoint(dataset):
+    out = StringIO()
+    call_command('explain_queries', min_rows=10 ** 6, stdout=out)
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 18
+    assert all(line.endswith(': ok') for line in lines)
+
+
+def test_explain_flags_full_scans(dataset):
+    out = StringIO()
+    with pytest.raises(CommandError):
+        call_command('explain_queries', min_rows=1, fail=True, stdout=out)
+    assert 'tags: полное сканирование dish_recipes_tag (3)' in out.getvalue()
+    assert 'ingredients: ok' in out.getvalue()
+
+
+def test_explain_uses_view_querysets(dataset, monkeypatch):
+    """Регрессия в get_queryset представления видна в отчете."""
+    get_queryset = RecipeViewSet.get_queryset
+    monkeypatch.setattr(
+        RecipeViewSet, 'get_queryset',
+        lambda view: get_queryset(view).order_by('text'))
+    out = StringIO()
+    call_command('explain_queries', min_rows=1, stdout=out)
+    assert ('recipes: лента: полное сканирование dish_recipes_recipe'
+            in out.getvalue())
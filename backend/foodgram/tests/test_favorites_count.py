@@ -0,0 +1,86 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from dish_recipes.models import FavoritesRecipe, Recipe
+from dish_recipes.utils import favorites_count_refreshed
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+def count(recipe):
+    recipe.refresh_from_db(fields=('favorites_count',))
+    return recipe.favorites_count
+
+
+def test_favorite_updates_counter(client_auth, recipes):
+    recipe = recipes[0]
+    url = f'{URL}{recipe.id}/favorite/'
+    assert client_auth.post(url).status_code == 201
+    assert count(recipe) == 1
+    assert client_auth.post(url).status_code == 400
+    assert count(recipe) == 1
+    assert client_auth.get(f'{URL}{recipe.id}/').json()['favorites_count'] == 1
+
+    assert client_auth.delete(url).status_code == 204
+    assert count(recipe) == 0
+    assert client_auth.delete(url).status_code == 400
+    assert count(recipe) == 0
+
+
+@pytest.fixture
+def popular(authors, recipes):
+    for place, recipe in enumerate(recipes[:len(authors)]):
+        for author in authors[:len(authors) - place]:
+            FavoritesRecipe.objects.create(user=author, recipe=recipe)
+    Recipe.objects.refresh_favorites_count()
+    return list(Recipe.objects.order_by(
+        '-favorites_count', '-pub_date', '-id').values_list('id', flat=True))
+
+
+def test_ordering_popular(client_anon, popular):
+    response = client_anon.get(URL, {'ordering': 'popular', 'limit': 100})
+    assert [item['id'] for item in response.json()['results']] == popular
+    default = client_anon.get(URL, {'limit': 100}).json()['results']
+    assert [item['id'] for item in default] != popular
+
+
+def test_ordering_popular_with_cursor(client_anon, popular):
+    ids = []
+    url = f'{URL}?ordering=popular&cursor=&limit=3'
+    while url:
+        response = client_anon.get(url)
+        ids.extend(item['id'] for item in response.json()['results'])
+        url = response.json()['next']
+    assert ids == popular
+    previous = client_anon.get(response.json()['previous']).json()['results']
+    assert [item['id'] for item in previous] == popular[-5:-2]
+
+
+def test_user_delete_refreshes_counters(authors, popular):
+    author = authors[0]
+    recipe_ids = list(FavoritesRecipe.objects.filter(
+        user=author).values_list('recipe_id', flat=True))
+    with favorites_count_refreshed(
+            FavoritesRecipe.objects.filter(user=author)):
+        author.delete()
+    for recipe in Recipe.objects.filter(pk__in=recipe_ids):
+        assert recipe.favorites_count == recipe.favorite_recipe.count()
+
+
+def test_reconcile_command(popular):
+    Recipe.objects.filter(pk__in=popular[:3]).update(favorites_count=42)
+    out = StringIO()
+    call_command('reconcile_favorites_count', '--dry-run', stdout=out)
+    assert 'Найдено расхождений: 3' in out.getvalue()
+    assert Recipe.objects.filter(favorites_count=42).count() == 3
+
+    out = StringIO()
+    call_command('reconcile_favorites_count', '--batch-size', '4',
+                 stdout=out)
+    assert 'Исправлено расхождений: 3' in out.getvalue()
+    for recipe in Recipe.objects.all():
+        assert recipe.favorites_count == recipe.favorite_recipe.count()
@@ -0,0 +1,123 @@
+import base64
+import io
+import os
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from PIL import Image
+
+from api.caching import get_version
+from dish_recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+def png(size, color='green'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def media_path(url):
+    return os.path.join(settings.MEDIA_ROOT, url[len('/media/'):])
+
+
+def test_variants_are_generated_on_create(client_auth, recipe_payload):
+    payload = recipe_payload()
+    payload['image'] = 'data:image/png;base64,' + base64.b64encode(
+        png((1200, 600))).decode()
+    response = client_auth.post(URL, payload, format='json')
+    assert response.status_code == 201
+    data = client_auth.get(f'{URL}{response.json()["id"]}/').json()
+    assert data['image_thumbnail'].endswith('.thumbnail.jpg')
+    assert data['image_thumbnail_webp'].endswith('.thumbnail_webp.webp')
+    assert data['image_webp'].endswith('.webp.webp')
+    with Image.open(media_path(data['image_thumbnail'])) as thumbnail:
+        assert thumbnail.size == (480, 240)
+    with Image.open(media_path(data['image_webp'])) as webp:
+        assert webp.format == 'WEBP' and webp.size == (1200, 600)
+
+    listed = client_auth.get(URL).json()['results'][0]
+    assert listed['image_thumbnail'] == data['image_thumbnail']
+
+
+def test_image_change_deletes_stale_variants(client_auth, recipe_payload):
+    payload = recipe_payload()
+    payload['image'] = 'data:image/png;base64,' + base64.b64encode(
+        png((64, 64))).decode()
+    recipe_id = client_auth.post(URL, payload, format='json').json()['id']
+    old = client_auth.get(f'{URL}{recipe_id}/').json()
+    payload['image'] = 'data:image/png;base64,' + base64.b64encode(
+        png((64, 64), color='red')).decode()
+    response = client_auth.patch(f'{URL}{recipe_id}/', payload,
+                                 format='json')
+    assert response.status_code == 200
+    new = client_auth.get(f'{URL}{recipe_id}/').json()
+    for field in ('image_thumbnail', 'image_thumbnail_webp', 'image_webp'):
+        assert new[field] != old[field]
+        assert not os.path.exists(media_path(old[field]))
+        assert os.path.exists(media_path(new[field]))
+
+
+def test_original_is_served_until_variants_exist(client_anon, recipes):
+    item = client_anon.get(URL).json()['results'][0]
+    assert item['image_thumbnail'] == item['image'] == item['image_webp']
+
+
+@pytest.mark.parametrize('option, value, message', (
+    ('RECIPE_IMAGE_MAX_SIZE', 10, 'КБ'),
+    ('RECIPE_IMAGE_MAX_DIMENSION', 1, 'px'),
+))
+def test_image_limits(client_auth, recipe_payload, settings, option, value,
+                      message):
+    setattr(settings, option, value)
+    response = client_auth.post(URL, recipe_payload(), format='json')
+    assert response.status_code == 400
+    assert message in str(response.json()['image'])
+    assert not Recipe.objects.exists()
+
+
+def test_dimensions_are_checked_before_verify(client_auth, recipe_payload,
+                                              settings, monkeypatch):
+    def verify(image):
+        raise AssertionError('verify() для слишком большого изображения')
+
+    monkeypatch.setattr(Image.Image, 'verify', verify)
+    settings.RECIPE_IMAGE_MAX_DIMENSION = 1
+    response = client_auth.post(URL, recipe_payload(), format='json')
+    assert response.status_code == 400
+    assert 'px' in str(response.json()['image'])
+
+
+def test_backfill_command_reports_decompression_bombs(recipes,
+                                                      monkeypatch):
+    def generate(recipe_id, bump=True):
+        raise Image.DecompressionBombError('слишком много пикселей')
+
+    monkeypatch.setattr(
+        'dish_recipes.management.commands.generate_image_variants.'
+        'generate_image_variants', generate)
+    out, err = StringIO(), StringIO()
+    call_command('generate_image_variants', stdout=out, stderr=err)
+    assert f'с ошибками: {len(recipes)}' in out.getvalue()
+    assert 'слишком много пикселей' in err.getvalue()
+
+
+def test_backfill_command(recipes):
+    for recipe in recipes[:2]:
+        recipe.image.save('backfill.png', ContentFile(png((64, 64))))
+    version = get_version('recipes')
+    out = StringIO()
+    call_command('generate_image_variants', stdout=out, stderr=StringIO())
+    recipes[0].refresh_from_db()
+    assert recipes[0].image_variants
+    assert 'Готово изображений: 2' in out.getvalue()
+    assert Recipe.objects.filter(image_variants=False).count() == len(
+        recipes) - 2
+    # версия ленты увеличивается один раз на всю пачку
+    assert get_version('recipes') == version + 1
@@ -0,0 +1,129 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from api.caching import get_version
+from dish_recipes.management.commands.parsers import readers
+from dish_recipes.management.commands.parsers.model_parsers import (
+    ingredient_parser)
+from dish_recipes.models import Ingredient, Tag
+
+pytestmark = pytest.mark.django_db
+
+INGREDIENTS = [
+    {'name': 'мука', 'measurement_unit': 'г'},
+    {'name': 'молоко', 'measurement_unit': 'мл'},
+    {'name': 'мука', 'measurement_unit': 'г'},
+    {'name': 'яйца', 'measurement_unit': 'шт.'},
+    {'name': 'мука', 'measurement_unit': 'кг'},
+]
+
+
+def run(*args, stderr=None):
+    out = StringIO()
+    call_command('import_data', *args, stdout=out, stderr=stderr)
+    return out.getvalue()
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps(INGREDIENTS, ensure_ascii=False, indent=2),
+                    encoding='utf-8')
+    return str(path)
+
+
+def test_json_is_streamed_in_batches(json_file, monkeypatch):
+    monkeypatch.setattr(readers, 'CHUNK_SIZE', 7)
+    version = get_version('ingredients')
+    out = run('--file', json_file, '--batch-size', '2')
+    assert 'Обработано строк: 2 ' in out and 'Обработано строк: 5 ' in out
+    assert 'создано 4, обновлено 0, пропущено 1' in out
+    assert Ingredient.objects.count() == 4
+    assert get_version('ingredients') != version
+
+    version = get_version('ingredients')
+    out = run('--file', json_file)
+    assert 'создано 0, обновлено 0, пропущено 5' in out
+    assert Ingredient.objects.count() == 4
+    assert get_version('ingredients') == version
+
+
+def test_dry_run(json_file):
+    out = run('--file', json_file, '--dry-run')
+    assert 'Будет: создано 4' in out
+    assert not Ingredient.objects.exists()
+
+
+def test_csv_tags_upsert(tmp_path, tags):
+    path = tmp_path / 'tags.csv'
+    path.write_text('name,slug,color\n'
+                    'Бранч,brunch,#000001\n'
+                    'Обед,lunch,#000002\n', encoding='utf-8')
+    out = run('--model', 'tag', '--file', str(path))
+    assert 'создано 1, обновлено 1, пропущено 0' in out
+    assert Tag.objects.get(slug='lunch').color == '#000002'
+    assert Tag.objects.filter(slug='brunch').exists()
+
+
+def test_tag_name_and_color_conflicts_are_reported(tmp_path, tags):
+    path = tmp_path / 'tags.csv'
+    path.write_text('name,slug,color\n'
+                    'Ужин,supper,#000001\n'
+                    'Бранч,brunch,#49B64E\n'
+                    'Перекус,snack,#000003\n'
+                    'Полдник,teatime,#000003\n'
+                    'Обед,lunch,#8775D2\n'
+                    'Завтрак,breakfast,#000004\n', encoding='utf-8')
+    errors = StringIO()
+    out = run('--model', 'tag', '--file', str(path), stderr=errors)
+    assert 'создано 1, обновлено 1, пропущено 0, конфликтов 4' in out
+    report = errors.getvalue()
+    assert "supper: name='Ужин'" in report
+    assert "brunch: color='#49B64E'" in report
+    assert "teatime: color='#000003'" in report
+    assert "lunch: color='#8775D2'" in report
+    assert set(Tag.objects.values_list('slug', 'color')) == {
+        ('breakfast', '#000004'), ('lunch', '#49B64E'),
+        ('dinner', '#8775D2'), ('snack', '#000003')}
+
+
+def test_created_counts_only_inserted_rows(json_file, monkeypatch):
+    Ingredient.objects.create(name='мука', measurement_unit='г')
+    existing = ingredient_parser.existing
+    calls = []
+
+    def stale_existing(keys):
+        # Первый запрос не видит строку, вставленную параллельно.
+        calls.append(keys)
+        return {} if len(calls) == 1 else existing(keys)
+
+    monkeypatch.setattr(ingredient_parser, 'existing', stale_existing)
+    out = run('--file', json_file)
+    assert 'создано 3, обновлено 0, пропущено 2' in out
+    assert Ingredient.objects.count() == 4
+
+
+def test_repository_catalogue_formats_match(monkeypatch):
+    monkeypatch.setattr(readers, 'CHUNK_SIZE', 1000)
+    run('--file', 'data/ingredients.json')
+    count = Ingredient.objects.count()
+    assert count > 2000
+    out = run('--file', 'data/ingredients.csv')
+    assert f'создано 0, обновлено 0, пропущено {count}' in out
+
+
+@pytest.mark.parametrize('content', (
+    '{"name": "мука"}',
+    '[{"name": "мука", "measurement_unit": "г"}, {"name": ',
+    '[{"name": "мука"}]',
+))
+def test_invalid_json(tmp_path, content):
+    path = tmp_path / 'broken.json'
+    path.write_text(content, encoding='utf-8')
+    with pytest.raises(CommandError):
+        run('--file', str(path))
+    assert not Ingredient.objects.exists()
@@ -0,0 +1,65 @@
+import pytest
+
+from api.ingredient_index import ingredient_index
+from dish_recipes.models import Ingredient
+
+pytestmark = pytest.mark.django_db
+
+CATALOGUE = (
+    ('молоко', 'мл'),
+    ('молоко сгущенное', 'г'),
+    ('кокосовое молоко', 'мл'),
+    ('картофель', 'г'),
+    ('ёжевика', 'г'),
+    ('соль', 'г'),
+)
+
+
+@pytest.fixture
+def catalogue():
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit=unit)
+        for name, unit in CATALOGUE
+    )
+
+
+def names(query):
+    return [item['name'] for item in ingredient_index.search(query)]
+
+
+def test_prefix_matches_go_before_substring(catalogue):
+    assert names('молоко') == [
+        'молоко', 'молоко сгущенное', 'кокосовое молоко']
+
+
+def test_typo_tolerant_match(catalogue):
+    assert names('картофиль') == ['картофель']
+
+
+def test_case_and_yo_are_normalized(catalogue):
+    assert names('ЕЖЕВ') == ['ёжевика']
+
+
+def test_result_has_serializer_fields(catalogue):
+    ingredient = Ingredient.objects.get(name='соль')
+    assert ingredient_index.search('соль') == [
+        {'id': ingredient.id, 'name': 'соль', 'measurement_unit': 'г'}]
+
+
+def test_empty_query(catalogue):
+    assert names('  ') == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_is_rebuilt_after_ingredient_changes(catalogue):
+    assert names('соль') == ['соль']
+    Ingredient.objects.create(name='соль морская', measurement_unit='г')
+    assert names('соль') == ['соль', 'соль морская']
+    Ingredient.objects.filter(name='соль').get().delete()
+    assert names('соль') == ['соль морская']
+
+
+def test_endpoint_ranks_results(client_anon, catalogue):
+    response = client_anon.get('/api/ingredients/', {'name': 'молоко'})
+    assert response.status_code == 200
+    assert [item['name'] for item in response.data][0] == 'молоко'
@@ -0,0 +1,69 @@
+import pytest
+
+from api.pagination import CustomPagination
+from dish_recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+def walk(client, url, key='next'):
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'count' not in response.json()
+        ids.extend(item['id'] for item in response.json()['results'])
+        url = response.json()[key]
+    return ids
+
+
+def test_cursor_walks_feed_forward_and_back(client_anon, recipes):
+    expected = list(Recipe.objects.order_by(
+        '-pub_date', '-id').values_list('id', flat=True))
+    assert walk(client_anon, f'{URL}?cursor=&limit=3') == expected
+
+    response = client_anon.get(f'{URL}?cursor=&limit=3')
+    while response.json()['next']:
+        last = response
+        response = client_anon.get(response.json()['next'])
+    back = client_anon.get(response.json()['previous'])
+    assert back.json()['results'] == last.json()['results']
+    assert back.json()['next'] == last.json()['next']
+
+
+def test_new_recipes_do_not_shift_pages(client_anon, recipes):
+    first = client_anon.get(f'{URL}?cursor=&limit=3')
+    Recipe.objects.create(author=recipes[0].author, name='Свежий', text='-',
+                          image='recipes/test.png', cooking_time=1)
+    second = client_anon.get(first.json()['next'])
+    seen = {item['id'] for item in first.json()['results']}
+    assert not seen & {item['id'] for item in second.json()['results']}
+
+
+def test_cursor_page_skips_count(client_anon, recipes, count_queries):
+    response, queries = count_queries(
+        client_anon.get, f'{URL}?cursor=&limit=3')
+    _, page_queries = count_queries(client_anon.get, f'{URL}?limit=3')
+    assert response.status_code == 200
+    assert queries == page_queries - 1
+
+
+@pytest.mark.parametrize('cursor', ('мусор', 'e30=', 'eyJwIjpbMV0sInIiOjB9',
+                                    'eyJwIjpbIngiLCIxIl0sInIiOjB9'))
+def test_invalid_cursor(client_anon, recipes, cursor):
+    response = client_anon.get(URL, {'cursor': cursor})
+    assert response.status_code == 404
+
+
+def test_subscriptions_cursor(client_auth, dataset, authors):
+    ids = walk(client_auth,
+               '/api/users/subscriptions/?cursor=&limit=1&recipes_limit=1')
+    assert ids == [author.id for author in authors]
+
+
+def test_limit_is_capped(client_anon, recipes, monkeypatch):
+    monkeypatch.setattr(CustomPagination, 'max_page_size', 4)
+    response = client_anon.get(URL, {'limit': 1000})
+    assert len(response.json()['results']) == 4
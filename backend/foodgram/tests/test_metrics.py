@@ -0,0 +1,156 @@
+import fcntl
+import json
+import os
+import re
+
+import pytest
+
+from api.metrics import (ARCHIVE, COMPACT_LOCK, FILE_PATTERN, LOCK_PATTERN,
+                         registry)
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/metrics'
+
+
+@pytest.fixture
+def metrics(settings, tmp_path):
+    settings.METRICS_ENABLED = True
+    settings.METRICS_DIR = str(tmp_path)
+    registry.reset()
+    yield tmp_path
+    registry.reset()
+
+
+def sample(text, name, **labels):
+    pattern = re.escape(name) + r'\{([^}]*)\} (\S+)'
+    for found, value in re.findall(pattern, text):
+        pairs = dict(re.findall(r'(\w+)="([^"]*)"', found))
+        if pairs == labels:
+            return float(value)
+    return None
+
+
+def test_route_metrics(metrics, client_anon, client_auth, recipes,
+                       count_queries):
+    client_auth.get('/api/recipes/')
+    _, queries = count_queries(client_auth.get, '/api/recipes/')
+    client_anon.get('/api/no-such-page/')
+    text = client_anon.get(URL).content.decode()
+    assert sample(text, 'foodgram_requests_total', route='recipes-list',
+                  method='GET', status='200') == 2
+    assert sample(text, 'foodgram_requests_total', route='unmatched',
+                  method='GET', status='404') == 1
+    assert sample(text, 'foodgram_request_duration_seconds_count',
+                  route='recipes-list') == 2
+    assert sample(text, 'foodgram_request_duration_seconds_bucket',
+                  route='recipes-list', le='+Inf') == 2
+    assert sample(text, 'foodgram_request_queries_sum',
+                  route='recipes-list') == 2 * queries
+    assert sample(text, 'foodgram_response_size_bytes_sum',
+                  route='recipes-list') > 0
+    assert '# TYPE foodgram_request_queries histogram' in text
+
+
+def test_streaming_response_counted_on_close(metrics, client_auth, dataset):
+    response = client_auth.get('/api/recipes/download_shopping_cart/',
+                               {'format': 'txt'})
+    assert not registry.histograms
+    body = b''.join(response.streaming_content)
+    text = client_auth.get(URL).content.decode()
+    route = 'recipes-download-shopping-cart'
+    assert sample(text, 'foodgram_request_duration_seconds_count',
+                  route=route) == 1
+    assert sample(text, 'foodgram_response_size_bytes_sum',
+                  route=route) == len(body)
+    # строки списка читаются из БД при отдаче тела
+    assert sample(text, 'foodgram_request_queries_sum', route=route) > 1
+
+
+def test_histogram_buckets_are_cumulative(metrics, client_anon, recipes):
+    client_anon.get('/api/recipes/')
+    text = client_anon.get(URL).content.decode()
+    buckets = [float(value) for value in re.findall(
+        r'foodgram_request_queries_bucket\{route="recipes-list",le="[^"]+"\} '
+        r'(\S+)', text)]
+    assert buckets == sorted(buckets)
+    assert buckets[-1] == 1
+
+
+def test_cache_hits_and_misses(metrics, client_anon, tags):
+    client_anon.get('/api/tags/')
+    client_anon.get('/api/tags/')
+    text = client_anon.get(URL).content.decode()
+    assert sample(text, 'foodgram_cache_requests_total',
+                  cache='tags', result='miss') == 1
+    assert sample(text, 'foodgram_cache_requests_total',
+                  cache='tags', result='hit') == 1
+
+
+WORKER_DATA = {
+    'counters': [['foodgram_requests_total',
+                  [['route', 'recipes-list'], ['method', 'GET'],
+                   ['status', '200']], 3]],
+    'histograms': [['foodgram_request_queries',
+                    [['route', 'recipes-list']],
+                    [0, 0, 1, 0, 0, 0, 0, 0], 3.0, 1]],
+}
+
+
+def test_workers_are_aggregated(metrics, client_anon, recipes):
+    name = f'{os.getpid() + 1}_1'
+    (metrics / FILE_PATTERN.format(name)).write_text(json.dumps(WORKER_DATA))
+    with open(metrics / LOCK_PATTERN.format(name), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        client_anon.get('/api/recipes/')
+        text = client_anon.get(URL).content.decode()
+        assert (metrics / FILE_PATTERN.format(name)).exists()
+    assert sample(text, 'foodgram_requests_total', route='recipes-list',
+                  method='GET', status='200') == 4
+    assert sample(text, 'foodgram_request_queries_count',
+                  route='recipes-list') == 2
+
+
+def test_dead_workers_are_compacted(metrics, client_anon, recipes):
+    # Прежний воркер с тем же pid: его файл не затирается, а уходит в архив.
+    name = f'{os.getpid()}_1'
+    (metrics / FILE_PATTERN.format(name)).write_text(json.dumps(WORKER_DATA))
+    (metrics / LOCK_PATTERN.format(name)).write_text('')
+    client_anon.get('/api/recipes/')
+    for _ in range(2):
+        text = client_anon.get(URL).content.decode()
+        assert sample(text, 'foodgram_requests_total', route='recipes-list',
+                      method='GET', status='200') == 4
+    assert sorted(path.name for path in metrics.iterdir()) == sorted([
+        ARCHIVE, COMPACT_LOCK, FILE_PATTERN.format(registry.name),
+        LOCK_PATTERN.format(registry.name),
+    ])
+    registry.flush(force=True)
+    registry.reset()
+    text = client_anon.get(URL).content.decode()
+    assert sample(text, 'foodgram_requests_total', route='metrics',
+                  method='GET', status='200') == 2
+    assert len(list(metrics.glob(FILE_PATTERN.format('*')))) == 2
+
+
+def test_unknown_methods_are_grouped(metrics, client_anon, recipes):
+    client_anon.generic('PROPFIND', '/api/recipes/')
+    client_anon.generic('BREW', '/api/recipes/')
+    text = client_anon.get(URL).content.decode()
+    assert sample(text, 'foodgram_requests_total', route='recipes-list',
+                  method='other', status='401') == 2
+    assert 'BREW' not in text
+
+
+def test_token(metrics, settings, client_anon):
+    settings.METRICS_TOKEN = 'secret'
+    assert client_anon.get(URL).status_code == 403
+    response = client_anon.get(URL, HTTP_AUTHORIZATION='Bearer secret')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+
+
+def test_disabled_by_default(client_anon, recipes):
+    registry.reset()
+    client_anon.get('/api/recipes/')
+    assert not registry.counters
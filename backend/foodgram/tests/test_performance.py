@@ -0,0 +1,83 @@
+import json
+import re
+
+import pytest
+
+from api.profiling import collect_timings, timed
+
+pytestmark = pytest.mark.django_db
+
+LOGGER = 'foodgram.performance'
+
+
+@pytest.fixture
+def timing(settings, caplog):
+    settings.PERFORMANCE_TIMING = True
+    caplog.set_level('INFO', logger=LOGGER)
+    return caplog
+
+
+def records(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records
+            if record.name == LOGGER]
+
+
+def test_disabled_by_default(client_anon, recipes):
+    response = client_anon.get('/api/recipes/')
+    assert 'Server-Timing' not in response
+
+
+def test_server_timing_and_log(timing, client_anon, recipes, count_queries):
+    response, queries = count_queries(client_anon.get, '/api/recipes/')
+    header = response['Server-Timing']
+    assert header.startswith('db;dur=')
+    assert f'desc="{queries} queries"' in header
+    assert re.search(r'serializer;dur=\d+\.\d', header)
+    assert re.search(r'total;dur=\d+\.\d', header)
+    record, = records(timing)
+    assert record['path'] == '/api/recipes/'
+    assert record['status'] == 200
+    assert record['queries'] == queries
+    assert record['total_ms'] >= record['serializer_ms'] > 0
+    assert 'too_many_queries' not in record
+
+
+def test_query_threshold(timing, settings, client_anon, recipes):
+    settings.PERFORMANCE_QUERY_THRESHOLD = 1
+    client_anon.get('/api/recipes/')
+    log, = [record for record in timing.records if record.name == LOGGER]
+    assert log.levelname == 'WARNING'
+    assert json.loads(log.getMessage())['too_many_queries'] is True
+
+
+def test_pdf_render_time(timing, client_auth, dataset):
+    response = client_auth.get('/api/recipes/download_shopping_cart/')
+    assert 'pdf;dur=' in response['Server-Timing']
+    b''.join(response.streaming_content)
+    assert records(timing)[0]['pdf_ms'] > 0
+
+
+def test_streaming_body_is_measured_on_close(timing, client_auth, dataset):
+    response = client_auth.get('/api/recipes/download_shopping_cart/',
+                               {'format': 'txt'})
+    assert response.streaming
+    assert 'total;dur=' in response['Server-Timing']
+    assert not records(timing)
+    body = b''.join(response.streaming_content)
+    assert body
+    record, = records(timing)
+    header_queries = int(re.search(
+        r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+    # строки списка читаются из БД уже при отдаче тела
+    assert record['queries'] > header_queries
+    assert record['status'] == 200
+
+
+def test_nested_spans_are_counted_once():
+    with collect_timings() as timings:
+        with timed('serializer'):
+            with timed('serializer'):
+                assert timings.active == {'serializer'}
+        outer = timings.spans['serializer']
+    assert outer > 0
+    assert timings.active == set()
@@ -0,0 +1,220 @@
+"""
+Бюджеты SQL-запросов для эндпоинтов API.
+
+Каждый тест фиксирует верхнюю границу числа запросов, а тесты
+масштабирования проверяют, что оно не растет вместе с размером страницы.
+"""
+import pytest
+
+from dish_recipes.models import Recipe, ShopList
+
+pytestmark = pytest.mark.django_db
+
+RECIPES_LIST_BUDGET = 8
+RECIPE_DETAIL_BUDGET = 6
+RECIPE_WRITE_BUDGET = 25
+USERS_LIST_BUDGET = 4
+SUBSCRIPTIONS_BUDGET = 4
+
+
+def test_recipes_list_anonymous(client_anon, dataset, count_queries):
+    response, queries = count_queries(client_anon.get, '/api/recipes/')
+    assert response.status_code == 200
+    assert queries <= RECIPES_LIST_BUDGET
+
+
+def test_recipes_list_authenticated(client_auth, dataset, count_queries):
+    response, queries = count_queries(client_auth.get, '/api/recipes/')
+    assert response.status_code == 200
+    assert queries <= RECIPES_LIST_BUDGET
+
+
+@pytest.mark.parametrize('params', (
+    '', '&is_favorited=1', '&is_in_shopping_cart=1', '&tags=lunch',
+))
+def test_recipes_list_does_not_grow_with_page_size(
+        client_auth, dataset, count_queries, params):
+    small, small_queries = count_queries(
+        client_auth.get, f'/api/recipes/?limit=2{params}')
+    large, large_queries = count_queries(
+        client_auth.get, f'/api/recipes/?limit=20{params}')
+    assert len(small.data['results']) <= len(large.data['results'])
+    assert small_queries == large_queries
+
+
+def test_recipe_detail(client_auth, dataset, count_queries):
+    recipe = dataset[0]
+    response, queries = count_queries(
+        client_auth.get, f'/api/recipes/{recipe.id}/')
+    assert response.status_code == 200
+    assert queries <= RECIPE_DETAIL_BUDGET
+
+
+def test_recipe_create(client_auth, recipe_payload, count_queries):
+    response, queries = count_queries(
+        client_auth.post, '/api/recipes/', recipe_payload(), format='json')
+    assert response.status_code == 201
+    assert queries <= RECIPE_WRITE_BUDGET
+
+
+def test_recipe_create_does_not_grow_with_ingredients(
+        client_auth, recipe_payload, count_queries):
+    _, few = count_queries(
+        client_auth.post, '/api/recipes/',
+        recipe_payload(2, name='Короткий'), format='json')
+    _, many = count_queries(
+        client_auth.post, '/api/recipes/',
+        recipe_payload(20, name='Длинный'), format='json')
+    assert few == many
+
+
+def test_recipe_partial_update(client_auth, user, recipe_payload,
+                               count_queries):
+    client_auth.post('/api/recipes/', recipe_payload(), format='json')
+    recipe = Recipe.objects.get(author=user)
+    response, queries = count_queries(
+        client_auth.patch, f'/api/recipes/{recipe.id}/',
+        recipe_payload(name='Измененный'), format='json')
+    assert response.status_code == 200
+    assert queries <= RECIPE_WRITE_BUDGET
+
+
+# Избранное меняет счетчик рецепта в той же транзакции (точка сохранения
+# в тестах - еще два запроса).
+@pytest.mark.parametrize('route, add_budget, delete_budget', (
+    ('favorite', 6, 6),
+    ('shopping_cart', 9, 7),
+))
+def test_recipe_relation_add_and_delete(client_auth, recipes, route,
+                                        add_budget, delete_budget,
+                                        count_queries):
+    url = f'/api/recipes/{recipes[-1].id}/{route}/'
+    response, queries = count_queries(client_auth.post, url)
+    assert response.status_code == 201
+    assert queries <= add_budget
+    response, queries = count_queries(client_auth.delete, url)
+    assert response.status_code == 204
+    assert queries <= delete_budget
+
+
+def test_download_shopping_cart(client_auth, dataset, count_queries):
+    response, queries = count_queries(
+        client_auth.get, '/api/recipes/download_shopping_cart/')
+    assert response.status_code == 200
+    assert queries <= 2
+
+
+def test_download_shopping_cart_does_not_grow_with_cart(
+        client_auth, user, dataset, count_queries):
+    _, small = count_queries(
+        client_auth.get, '/api/recipes/download_shopping_cart/')
+    for recipe in dataset:
+        ShopList.objects.get_or_create(user=user, recipe=recipe)
+    _, large = count_queries(
+        client_auth.get, '/api/recipes/download_shopping_cart/')
+    assert small == large
+
+
+def test_users_list(client_auth, dataset, count_queries):
+    response, queries = count_queries(client_auth.get, '/api/users/')
+    assert response.status_code == 200
+    assert queries <= USERS_LIST_BUDGET
+
+
+def test_users_list_does_not_grow_with_page_size(client_auth, dataset,
+                                                 count_queries):
+    _, small = count_queries(client_auth.get, '/api/users/?limit=1')
+    _, large = count_queries(client_auth.get, '/api/users/?limit=5')
+    assert small == large
+
+
+def test_user_detail(client_auth, authors, count_queries):
+    response, queries = count_queries(
+        client_auth.get, f'/api/users/{authors[0].id}/')
+    assert response.status_code == 200
+    assert queries <= 3
+
+
+def test_subscriptions(client_auth, dataset, count_queries):
+    response, queries = count_queries(
+        client_auth.get, '/api/users/subscriptions/?recipes_limit=2')
+    assert response.status_code == 200
+    assert queries <= SUBSCRIPTIONS_BUDGET
+
+
+def test_subscriptions_do_not_grow_with_page_size(client_auth, dataset,
+                                                  count_queries):
+    _, small = count_queries(
+        client_auth.get, '/api/users/subscriptions/?limit=1&recipes_limit=2')
+    _, large = count_queries(
+        client_auth.get, '/api/users/subscriptions/?limit=4&recipes_limit=2')
+    assert small == large
+
+
+def test_subscribe_and_unsubscribe(client_auth, authors, recipes,
+                                   count_queries):
+    url = f'/api/users/{authors[0].id}/subscribe/'
+    response, queries = count_queries(client_auth.post, url)
+    assert response.status_code == 201
+    assert queries <= 10
+    response, queries = count_queries(client_auth.delete, url)
+    assert response.status_code == 204
+    assert queries <= 4
+
+
+def test_tags(client_anon, tags, count_queries):
+    response, queries = count_queries(client_anon.get, '/api/tags/')
+    assert response.status_code == 200
+    assert queries <= 1
+
+
+def test_ingredients(client_anon, ingredients, count_queries):
+    response, queries = count_queries(client_anon.get, '/api/ingredients/')
+    assert response.status_code == 200
+    assert queries <= 1
+    response, queries = count_queries(
+        client_anon.get, '/api/ingredients/?name=ингр')
+    assert response.status_code == 200
+    assert queries <= 1
+    response, queries = count_queries(
+        client_anon.get, '/api/ingredients/?name=ингредиент 1')
+    assert response.status_code == 200
+    assert queries == 0
+
+
+def test_recipe_update_writes_only_changes(client_auth, user, recipe_payload,
+                                           count_queries):
+    client_auth.post('/api/recipes/', recipe_payload(20), format='json')
+    recipe = Recipe.objects.get(author=user)
+    _, rename = count_queries(
+        client_auth.patch, f'/api/recipes/{recipe.id}/',
+        {'name': 'Переименованный'}, format='json')
+    _, rewrite = count_queries(
+        client_auth.patch, f'/api/recipes/{recipe.id}/',
+        recipe_payload(20, name='Переименованный'), format='json')
+    assert rename <= RECIPE_WRITE_BUDGET
+    assert rewrite - rename <= 6
+
+
+def test_recipe_ingredient_rewrite_does_not_grow(client_auth, ingredients,
+                                                recipe_payload, count_queries):
+    """
+    Замена набора ингредиентов (одна строка удаляется, одна добавляется,
+    у остальных меняется количество) не зависит от их числа.
+    """
+    queries = []
+    for size in (2, 20):
+        payload = recipe_payload(size, name=f'Рецепт на {size}')
+        recipe_id = client_auth.post(
+            '/api/recipes/', payload, format='json').data['id']
+        payload['ingredients'] = [
+            {'id': item['id'], 'amount': 20}
+            for item in payload['ingredients'][1:]
+        ] + [{'id': ingredients[size].id, 'amount': 5}]
+        del payload['image']
+        response, count = count_queries(
+            client_auth.patch, f'/api/recipes/{recipe_id}/', payload,
+            format='json')
+        assert response.status_code == 200
+        queries.append(count)
+    assert queries[0] == queries[1]
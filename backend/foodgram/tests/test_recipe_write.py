@@ -0,0 +1,112 @@
+import pytest
+
+from dish_recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+pytestmark = pytest.mark.django_db
+
+
+def recipe_state(recipe):
+    return (
+        sorted(recipe.recipe_ingredients.values_list(
+            'ingredient_id', 'amount')),
+        sorted(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True)),
+    )
+
+
+@pytest.fixture
+def created(client_auth, user, recipe_payload):
+    client_auth.post('/api/recipes/', recipe_payload(5), format='json')
+    return Recipe.objects.get(author=user)
+
+
+def test_create_saves_ingredients_and_tags(created, recipe_payload):
+    payload = recipe_payload(5)
+    ingredients, tags = recipe_state(created)
+    assert ingredients == sorted(
+        (item['id'], item['amount']) for item in payload['ingredients'])
+    assert tags == sorted(payload['tags'])
+
+
+def test_update_keeps_unchanged_rows(client_auth, created, recipe_payload,
+                                     tags):
+    untouched = set(
+        created.recipe_ingredients.values_list('pk', flat=True))
+    payload = recipe_payload(5)
+    payload['ingredients'][0]['amount'] = 99
+    removed = payload['ingredients'].pop()
+    payload['tags'] = [tags[1].id, tags[2].id]
+
+    response = client_auth.patch(
+        f'/api/recipes/{created.id}/', payload, format='json')
+    assert response.status_code == 200
+    ingredients, recipe_tags = recipe_state(created)
+    assert ingredients == sorted(
+        (item['id'], item['amount']) for item in payload['ingredients'])
+    assert removed['id'] not in dict(ingredients)
+    assert recipe_tags == sorted(payload['tags'])
+    assert set(
+        created.recipe_ingredients.values_list('pk', flat=True)) < untouched
+
+
+def test_removed_amounts_are_deleted(client_auth, created, recipe_payload):
+    client_auth.patch(f'/api/recipes/{created.id}/',
+                      recipe_payload(2), format='json')
+    assert RecipeIngredient.objects.count() == 2
+
+
+def test_patch_without_ingredients_keeps_them(client_auth, created):
+    before = recipe_state(created)
+    response = client_auth.patch(
+        f'/api/recipes/{created.id}/', {'name': 'Другое'}, format='json')
+    assert response.status_code == 200
+    assert recipe_state(created) == before
+
+
+def test_failed_write_is_rolled_back(client_auth, created, recipe_payload,
+                                     monkeypatch):
+    before = recipe_state(created)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(RecipeIngredient.objects, 'bulk_update', broken)
+    payload = recipe_payload(5)
+    payload['ingredients'][0]['amount'] = 99
+    payload['tags'] = payload['tags'][:1]
+    with pytest.raises(RuntimeError):
+        client_auth.patch(f'/api/recipes/{created.id}/', payload,
+                          format='json')
+    assert recipe_state(created) == before
+
+
+def test_write_response_keeps_its_format(client_auth, recipe_payload):
+    payload = recipe_payload(2)
+    response = client_auth.post('/api/recipes/', payload, format='json')
+    assert set(response.data) == {'id', 'tags', 'author', 'ingredients',
+                                  'name', 'text', 'image', 'cooking_time'}
+    assert response.data['tags'] == payload['tags']
+    assert [item['amount'] for item in response.data['ingredients']] == [
+        10, 10]
+    response = client_auth.patch(f'/api/recipes/{response.data["id"]}/',
+                                 {'name': 'Другое имя'}, format='json')
+    assert response.data['name'] == 'Другое имя'
+    assert 'is_favorited' not in response.data
+
+
+@pytest.mark.parametrize('field, mutate', (
+    ('ingredients', lambda payload: payload['ingredients'].append(
+        dict(payload['ingredients'][0]))),
+    ('ingredients', lambda payload: payload['ingredients'].append(
+        {'id': 100500, 'amount': 1})),
+    ('tags', lambda payload: payload['tags'].append(payload['tags'][0])),
+    ('tags', lambda payload: payload['tags'].append(100500)),
+))
+def test_duplicate_and_unknown_ids_are_rejected(client_auth, recipe_payload,
+                                                field, mutate):
+    payload = recipe_payload(3)
+    mutate(payload)
+    response = client_auth.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+    assert field in response.data
+    assert not Recipe.objects.exists()
@@ -0,0 +1,56 @@
+import pytest
+
+from dish_recipes.models import Ingredient, Tag
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('url', ('/api/tags/', '/api/ingredients/'))
+def test_repeated_request_is_served_from_cache(
+        client_anon, tags, ingredients, count_queries, url):
+    first = client_anon.get(url)
+    second, queries = count_queries(client_anon.get, url)
+    assert queries == 0
+    assert second.content == first.content
+    assert second['ETag'] == first['ETag']
+    assert 'max-age' in second['Cache-Control']
+
+
+def test_cached_payload_matches_serializer(client_anon, tags):
+    client_anon.get('/api/tags/')
+    response = client_anon.get('/api/tags/')
+    assert response.json()[0] == {
+        'id': tags[0].id, 'name': tags[0].name,
+        'slug': tags[0].slug, 'color': tags[0].color}
+
+
+def test_if_none_match_returns_not_modified(client_anon, tags,
+                                            count_queries):
+    etag = client_anon.get('/api/tags/')['ETag']
+    response, queries = count_queries(
+        client_anon.get, '/api/tags/', HTTP_IF_NONE_MATCH=f'W/{etag}')
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+    assert queries == 0
+
+
+def test_detail_has_own_etag(client_anon, tags):
+    detail = client_anon.get(f'/api/tags/{tags[0].id}/')
+    assert detail.status_code == 200
+    assert detail['ETag'] != client_anon.get('/api/tags/')['ETag']
+    assert client_anon.get('/api/tags/0/').status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url, create', (
+    ('/api/tags/', lambda: Tag.objects.create(
+        name='Новый', slug='new', color='#000000')),
+    ('/api/ingredients/', lambda: Ingredient.objects.create(
+        name='новый', measurement_unit='г')),
+))
+def test_changes_bump_version(client_anon, url, create):
+    before = client_anon.get(url)
+    create()
+    after = client_anon.get(url)
+    assert after['ETag'] != before['ETag']
+    assert len(after.json()) == len(before.json()) + 1
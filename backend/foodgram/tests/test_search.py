@@ -0,0 +1,69 @@
+import pytest
+
+from api.search import refresh_search_documents
+from dish_recipes.models import Ingredient, Recipe, RecipeIngredient
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def menu(authors, ingredients):
+    beet = Ingredient.objects.create(name='Свёкла', measurement_unit='г')
+    recipes = {}
+    for name, text, ingredient in (
+            ('Борщ украинский', 'Суп со свеклой', beet),
+            ('Салат', 'Винегрет, в который кладут борщ', ingredients[0]),
+            ('Свекольник', 'Холодный суп', beet)):
+        recipe = Recipe.objects.create(
+            author=authors[0], name=name, text=text,
+            image='recipes/test.png', cooking_time=10)
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1)
+        recipes[name] = recipe
+    refresh_search_documents(Recipe.objects.values('pk'))
+    return recipes
+
+
+def found(client, query):
+    response = client.get(URL, {'search': query})
+    assert response.status_code == 200
+    return [item['name'] for item in response.json()['results']]
+
+
+def test_name_matches_rank_first(client_anon, menu):
+    assert found(client_anon, 'борщ') == ['Борщ украинский', 'Салат']
+
+
+def test_search_is_case_and_yo_insensitive(client_anon, menu):
+    assert found(client_anon, 'СВЁКЛА') == found(client_anon, 'свекла')
+    assert set(found(client_anon, 'свекла')) == {
+        'Борщ украинский', 'Свекольник'}
+
+
+def test_every_word_must_match(client_anon, menu):
+    assert found(client_anon, 'суп холодный') == ['Свекольник']
+    assert found(client_anon, 'суп торт') == []
+
+
+def test_search_rejects_cursor(client_anon, menu):
+    response = client_anon.get(URL, {'search': 'борщ', 'cursor': ''})
+    assert response.status_code == 400
+
+
+def test_document_follows_writes(client_auth, user, recipe_payload,
+                                 ingredients):
+    client_auth.post(URL, recipe_payload(2, name='Шарлотка'), format='json')
+    recipe = Recipe.objects.get(author=user)
+    assert found(client_auth, 'шарлотка') == ['Шарлотка']
+    assert found(client_auth, ingredients[1].name) == ['Шарлотка']
+
+    client_auth.patch(f'{URL}{recipe.id}/', {'name': 'Пирог'},
+                      format='json')
+    assert found(client_auth, 'шарлотка') == []
+    assert found(client_auth, ingredients[1].name) == ['Пирог']
+
+    ingredients[1].name = 'корица'
+    ingredients[1].save()
+    assert found(client_auth, 'корица') == ['Пирог']
@@ -0,0 +1,98 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from api.shopping_cart import change_cart_totals
+from dish_recipes.models import Recipe, ShopList, ShoppingCartTotal
+
+pytestmark = pytest.mark.django_db
+
+
+def totals(user):
+    return dict(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient__name', 'amount'))
+
+
+def expected(user):
+    """Итоги, посчитанные заново по рецептам из корзины."""
+    return expected_for(
+        *Recipe.objects.filter(recipe_shop_lists__user=user))
+
+
+def expected_for(*recipes):
+    result = {}
+    for recipe in recipes:
+        for item in recipe.recipe_ingredients.select_related('ingredient'):
+            name = item.ingredient.name
+            result[name] = result.get(name, 0) + item.amount
+    return result
+
+
+def test_totals_follow_cart_changes(client_auth, user, recipes):
+    first, second = recipes[0], recipes[3]
+    client_auth.post(f'/api/recipes/{first.id}/shopping_cart/')
+    client_auth.post(f'/api/recipes/{second.id}/shopping_cart/')
+    assert totals(user) == expected(user)
+    assert totals(user)
+
+    client_auth.delete(f'/api/recipes/{first.id}/shopping_cart/')
+    assert totals(user) == expected(user)
+    client_auth.delete(f'/api/recipes/{second.id}/shopping_cart/')
+    assert totals(user) == {}
+
+
+def test_download_reads_totals(client_auth, user, dataset):
+    response = client_auth.get(
+        '/api/recipes/download_shopping_cart/', {'format': 'txt'})
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert len(lines) == len(expected(user))
+
+
+def test_totals_survive_concurrent_insert(user, recipes):
+    recipe = recipes[0]
+    item = recipe.recipe_ingredients.first()
+    # Строку итога уже вставила параллельная транзакция.
+    ShoppingCartTotal.objects.create(
+        user=user, ingredient=item.ingredient, amount=5)
+    change_cart_totals(user.id, recipe.id, 1)
+    result = expected_for(recipe)
+    result[item.ingredient.name] += 5
+    assert totals(user) == result
+
+
+def test_recipe_edit_updates_carts_of_other_users(
+        client_auth, user, authors, recipe_payload):
+    client_auth.post('/api/recipes/', recipe_payload(), format='json')
+    recipe = Recipe.objects.get(author=user)
+    for author in authors:
+        ShopList.objects.create(user=author, recipe=recipe)
+
+    client_auth.patch(f'/api/recipes/{recipe.id}/',
+                      recipe_payload(ingredients_count=2), format='json')
+    for author in authors:
+        assert totals(author) == expected(author)
+        assert len(totals(author)) == 2
+
+
+def test_ingredient_rows_update_carts(user, dataset):
+    in_cart = ShopList.objects.filter(user=user).first().recipe
+    item = in_cart.recipe_ingredients.first()
+    item.amount = 999
+    item.save()
+    assert totals(user) == expected(user)
+    item.delete()
+    assert totals(user) == expected(user)
+
+
+def test_recipe_delete_updates_carts(user, dataset):
+    in_cart = ShopList.objects.filter(user=user).first().recipe
+    in_cart.delete()
+    assert totals(user) == expected(user)
+
+
+def test_rebuild_command_repairs_drift(user, dataset):
+    before = totals(user)
+    ShoppingCartTotal.objects.filter(user=user).update(amount=1)
+    call_command('rebuild_cart_totals', stdout=StringIO())
+    assert totals(user) == before == expected(user)
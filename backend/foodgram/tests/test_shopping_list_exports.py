@@ -0,0 +1,89 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from api import shopping_cart
+from dish_recipes.models import ShoppingListExport
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def test_export_job_is_created_and_rendered(client_auth, dataset):
+    response = client_auth.post(URL)
+    assert response.status_code == 202
+    assert response.data['status'] == ShoppingListExport.DONE
+
+    status = client_auth.get(
+        f'/api/shopping_list_exports/{response.data["id"]}/')
+    assert status.status_code == 200
+    assert status.data['download'].endswith(
+        f'/api/shopping_list_exports/{response.data["id"]}/download/')
+
+    download = client_auth.get(status.data['download'])
+    assert download.status_code == 200
+    assert download['Content-Type'] == 'application/pdf'
+    assert download.content.startswith(b'%PDF')
+
+
+def test_pending_export_cannot_be_downloaded(client_auth, user):
+    export = ShoppingListExport.objects.create(user=user)
+    response = client_auth.get(
+        f'/api/shopping_list_exports/{export.id}/download/')
+    assert response.status_code == 400
+    status = client_auth.get(f'/api/shopping_list_exports/{export.id}/')
+    assert status.data['download'] is None
+
+
+def test_failed_export_reports_error(client_auth, dataset, monkeypatch):
+    def broken(user):
+        raise RuntimeError('сбой')
+
+    monkeypatch.setattr(shopping_cart, 'shopping_list', broken)
+    response = client_auth.post(URL)
+    assert response.data['status'] == ShoppingListExport.FAILED
+    assert response.data['error'] == 'сбой'
+
+
+def test_export_of_other_user_is_hidden(client_auth, authors):
+    export = ShoppingListExport.objects.create(user=authors[0])
+    assert client_auth.get(
+        f'/api/shopping_list_exports/{export.id}/').status_code == 404
+    assert client_auth.get(
+        f'/api/shopping_list_exports/{export.id}/download/'
+    ).status_code == 404
+
+
+def test_synchronous_download_is_unchanged(client_auth, dataset):
+    response = client_auth.get(URL)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+
+def expire(export):
+    ShoppingListExport.objects.filter(pk=export.pk).update(
+        created=timezone.now() - datetime.timedelta(days=2))
+
+
+def test_expired_export_is_gone(client_auth, dataset):
+    export_id = client_auth.post(URL).data['id']
+    expire(ShoppingListExport(pk=export_id))
+    assert client_auth.get(
+        f'/api/shopping_list_exports/{export_id}/').status_code == 404
+    assert client_auth.get(
+        f'/api/shopping_list_exports/{export_id}/download/'
+    ).status_code == 404
+
+
+def test_next_export_removes_expired_ones(client_auth, user, authors,
+                                          dataset):
+    old = ShoppingListExport.objects.create(user=user)
+    other = ShoppingListExport.objects.create(user=authors[0])
+    expire(old)
+    expire(other)
+    recent = ShoppingListExport.objects.create(user=user)
+    new_id = client_auth.post(URL).data['id']
+    assert set(ShoppingListExport.objects.values_list('pk', flat=True)) == {
+        other.pk, recent.pk, new_id}
@@ -0,0 +1,76 @@
+import csv
+import io
+import json
+
+import pytest
+
+from dish_recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                 ShopList)
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.fixture
+def cart(user, authors):
+    """Две позиции с одним ингредиентом суммируются."""
+    salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+    milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+    for amounts in ((salt, 5), (milk, 200)), ((salt, 10),):
+        recipe = Recipe.objects.create(
+            author=authors[0], name=f'Рецепт {len(amounts)}', text='-',
+            image='recipes/test.png', cooking_time=5)
+        for ingredient, amount in amounts:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+        ShopList.objects.create(user=user, recipe=recipe)
+
+
+def content(response):
+    assert response.status_code == 200
+    assert response.streaming
+    return b''.join(response.streaming_content).decode()
+
+
+def test_txt(client_auth, cart):
+    response = client_auth.get(URL, {'format': 'txt'})
+    assert response['Content-Type'].startswith('text/plain')
+    assert content(response) == 'молоко -- 200 мл\nсоль -- 15 г\n'
+
+
+def test_csv(client_auth, cart):
+    response = client_auth.get(URL, {'format': 'csv'})
+    assert 'BuyList.csv' in response['Content-Disposition']
+    assert list(csv.reader(io.StringIO(content(response)))) == [
+        ['name', 'measurement_unit', 'amount'],
+        ['молоко', 'мл', '200'],
+        ['соль', 'г', '15'],
+    ]
+
+
+def test_json(client_auth, cart):
+    response = client_auth.get(URL, {'format': 'json'})
+    assert json.loads(content(response)) == [
+        {'name': 'молоко', 'measurement_unit': 'мл', 'amount': 200},
+        {'name': 'соль', 'measurement_unit': 'г', 'amount': 15},
+    ]
+
+
+def test_empty_cart_json(client_auth, user):
+    assert json.loads(content(client_auth.get(URL, {'format': 'json'}))) == []
+
+
+def test_pdf_is_default(client_auth, cart):
+    response = client_auth.get(URL, {'format': 'pdf'})
+    assert response['Content-Type'] == 'application/pdf'
+    assert client_auth.get(URL)['Content-Type'] == 'application/pdf'
+
+
+def test_unknown_format(client_auth, cart):
+    response = client_auth.get(URL, {'format': 'xml'})
+    assert response.status_code == 400
+
+
+def test_anonymous_is_rejected(client_anon):
+    assert client_anon.get(URL, {'format': 'txt'}).status_code == 401
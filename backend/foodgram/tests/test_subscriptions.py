@@ -0,0 +1,35 @@
+import pytest
+
+from dish_recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/users/subscriptions/'
+
+
+def test_recipes_are_limited_per_author(client_auth, dataset, authors):
+    response = client_auth.get(URL, {'recipes_limit': 2, 'limit': 10})
+    assert response.status_code == 200
+    results = response.data['results']
+    assert [item['id'] for item in results] == [
+        author.id for author in authors]
+    for item in results:
+        latest = Recipe.objects.filter(
+            author_id=item['id']).values_list('id', flat=True)
+        assert [recipe['id'] for recipe in item['recipes']] == list(
+            latest[:2])
+        assert item['recipes_count'] == latest.count()
+        assert item['is_subscribed'] is True
+
+
+@pytest.mark.parametrize('limit', ('', 'abc', '-1'))
+def test_invalid_limit_returns_all_recipes(client_auth, dataset, limit):
+    response = client_auth.get(URL, {'recipes_limit': limit})
+    assert response.status_code == 200
+    for item in response.data['results']:
+        assert len(item['recipes']) == item['recipes_count']
+
+
+def test_no_subscriptions(client_auth):
+    response = client_auth.get(URL)
+    assert response.status_code == 400
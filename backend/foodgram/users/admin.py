@@ -1,15 +1,32 @@
 from django.contrib import admin
 
+from api.shopping_cart import deferred_cart_totals
+from dish_recipes.models import FavoritesRecipe
+from dish_recipes.paginator import EstimatedCountPaginator
+from dish_recipes.utils import favorites_count_refreshed
+
 from .models import CustomUser
 
 
 class CustomUserAdmin(admin.ModelAdmin):
     """ Администрирование пользователей."""
     list_display = ('id', 'email', 'username')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ('username',)
     empty_value_display = '-пусто-'
 
+    def delete_model(self, request, obj):
+        favorites = FavoritesRecipe.objects.filter(user=obj)
+        with favorites_count_refreshed(favorites), deferred_cart_totals():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        favorites = FavoritesRecipe.objects.filter(user__in=queryset)
+        with favorites_count_refreshed(favorites), deferred_cart_totals():
+            super().delete_queryset(request, queryset)
+
 
 admin.site.register(CustomUser, CustomUserAdmin)